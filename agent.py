@@ -1,25 +1,103 @@
 from langgraph.prebuilt import create_react_agent
+from langgraph.checkpoint.memory import InMemorySaver
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from cache import default_cache
+from memory import make_history_hook
+from router import default_router
 from tools import tools
-from voice_control import s2t, t2s
-import constants, json
+from tool_runner import make_tool_node
+from voice_control import s2t, t2s, speaker, s2t_stats, s2t_summary, wake_summary
+import constants, json, re, time, tracing
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+_TRACE_COMMANDS = {"/trace", "trace summary", "show trace summary"}
+
+
+def _chunk_text(content) -> str:
+    """Return the text of a message chunk whose content may be a string or content blocks."""
+    if isinstance(content, str):
+        return content
+    return "".join(b.get("text", "") for b in content if isinstance(b, dict) and b.get("type") == "text")
+
 
 # Make sure your API key is set
 # Create agent with OpenAI model
 # Create the agent
 class Agent:
-    def __init__(self, mode: str = "text"):
+    def __init__(self, mode: str = "text", stream: bool = False, session_id: str = "default", router=default_router,
+                 wake_word: str = None, pretranscribe: bool = False):
         """Create an Agent.
 
         mode: 'text' | 'speech' | 'auto'
+        stream: print tokens and speak sentences as they arrive instead of
+        waiting for the whole reply.
+        session_id: conversation whose (bounded) history is carried between turns.
+        router: factory for the fast-path Router tried before the LLM, or None
+        to send every turn to the model.
+        wake_word: in speech/auto mode, only start recognising an utterance
+        after this phrase is heard.
+        pretranscribe: in speech/auto mode, keep transcribing while a turn
+        runs so the next command can be spoken before the reply ends.
         """
         self.mode = mode
+        self.stream = stream
+        self.session_id = session_id
+        self.wake_word = wake_word
+        self.pretranscribe = pretranscribe
+        self.turn_stats = []
+        self.router = router() if router else None
         self.prompts = json.load(open("prompts.json"))
         self.agent = create_react_agent(
             model=constants.gpt_model,
-            tools=tools,
-            prompt=self.prompts['system']
+            tools=make_tool_node(tools),
+            prompt=self.prompts['system'],
+            # per-session history, trimmed to a token budget before each model call
+            pre_model_hook=make_history_hook(),
+            checkpointer=InMemorySaver(),
         )
 
+    def _config(self, session_id: str = None) -> dict:
+        config = {"configurable": {"thread_id": session_id or self.session_id}}
+        if tracing.enabled:
+            config["callbacks"] = tracing.langchain_callbacks()
+        return config
+
+    def _fast_path(self, user_input: str, session_id: str = None):
+        """Answer `user_input` through the router if it can.
+
+        Returns (tool name, reply) or None. Routed turns are written to the
+        session history so follow-up questions to the model still see them.
+        """
+        if self.router is None:
+            return None
+        handled = self.router.handle(user_input)
+        if handled is not None:
+            self.agent.update_state(self._config(session_id),
+                                    {"messages": [HumanMessage(user_input), AIMessage(handled[1])]}, as_node="agent")
+        return handled
+
+    def answer(self, user_input: str, session_id: str = None) -> dict:
+        """Run one turn without console I/O.
+
+        Returns {"reply", "tools": {name: calls}, "fast_path": bool}. Turns
+        with different session ids are independent and may run concurrently.
+        """
+        with tracing.span("turn", session=session_id, chars=len(user_input)):
+            return self._answer(user_input, session_id)
+
+    def _answer(self, user_input: str, session_id: str = None) -> dict:
+        handled = self._fast_path(user_input, session_id)
+        if handled is not None:
+            return {"reply": handled[1], "tools": {handled[0]: 1}, "fast_path": True}
+        result = self.agent.invoke({"messages": [{"role": "user", "content": user_input}]}, self._config(session_id))
+        tools_used = {}
+        for msg in reversed(result['messages']):
+            if isinstance(msg, HumanMessage):
+                break
+            if isinstance(msg, ToolMessage):
+                tools_used[msg.name] = tools_used.get(msg.name, 0) + 1
+        return {"reply": _chunk_text(result['messages'][-1].content), "tools": tools_used, "fast_path": False}
+
     def _get_user_input(self):
         """Return user input depending on mode.
 
@@ -35,7 +113,7 @@ class Agent:
         if self.mode == "auto":
             # prefer speech if recognizer exists
             if constants.rec is not None:
-                return s2t()
+                return self._listen()
             else:
                 try:
                     return input("Type your input: ")
@@ -43,7 +121,10 @@ class Agent:
                     return ""
 
         # explicit speech mode
-        return s2t()
+        return self._listen()
+
+    def _listen(self):
+        return s2t(self.wake_word, self.pretranscribe)
 
     def _output_response(self, text: str):
         """Output agent response according to mode: print always; speak only in speech/auto when recognizer present."""
@@ -55,6 +136,106 @@ class Agent:
                 # swallow TTS errors to avoid crashing the loop
                 pass
 
+    def _speaking(self) -> bool:
+        return self.mode in ("speech", "auto") and constants.rec is not None
+
+    def stream_events(self, user_input: str, session_id: str = None):
+        """Run one turn and yield its events as they happen.
+
+        Events are ("tool_call", name), ("tool_result", name) and
+        ("token", text). Only the model's own output is yielded as tokens;
+        history rewrites by the pre-model hook are not.
+        """
+        for msg, meta in self.agent.stream(
+            {"messages": [{"role": "user", "content": user_input}]},
+            self._config(session_id),
+            stream_mode="messages",
+        ):
+            node = meta.get("langgraph_node")
+            if node == "tools":
+                yield "tool_result", getattr(msg, "name", "tool")
+                continue
+            if node != "agent":
+                continue
+            calls = getattr(msg, "tool_call_chunks", None) or getattr(msg, "tool_calls", None) or []
+            for call in calls:
+                if call.get("name"):
+                    yield "tool_call", call["name"]
+            text = _chunk_text(msg.content)
+            if text:
+                yield "token", text
+
+    def _stream_turn(self, user_input: str) -> str:
+        """Run one turn with the graph's message stream.
+
+        Tokens are printed as they arrive, each finished sentence goes
+        straight to TTS and tool calls are announced as they start and end.
+        Returns the full text of the final reply.
+        """
+        t0 = time.monotonic()
+        first_token = first_spoken = None
+        pending = ""
+        reply = []
+        for kind, value in self.stream_events(user_input):
+            if kind == "tool_call":
+                print(f"[calling {value}…]", flush=True)
+                continue
+            if kind == "tool_result":
+                print(f"[{value} done]", flush=True)
+                continue
+            text = value
+            if first_token is None:
+                first_token = time.monotonic() - t0
+            print(text, end="", flush=True)
+            reply.append(text)
+            if self._speaking():
+                *sentences, pending = _SENTENCE_END.split(pending + text)
+                for sentence in sentences:
+                    if first_spoken is None:
+                        first_spoken = time.monotonic() - t0
+                    self._speak(sentence)
+        print()
+        if pending.strip() and self._speaking():
+            if first_spoken is None:
+                first_spoken = time.monotonic() - t0
+            self._speak(pending)
+        self.turn_stats.append({"first_token": first_token, "first_spoken": first_spoken,
+                                "total": time.monotonic() - t0})
+        return "".join(reply)
+
+    def _speak(self, text: str):
+        try:
+            t2s(text)
+        except Exception:
+            # swallow TTS errors to avoid crashing the loop
+            pass
+
+    def latency_summary(self) -> str:
+        """Average time-to-first-token / first-spoken-word / total over streamed turns."""
+        def avg(key):
+            vals = [s[key] for s in self.turn_stats if s[key] is not None]
+            return f"{sum(vals) / len(vals):.2f}s" if vals else "n/a"
+        return (f"turns: {len(self.turn_stats)}, first token {avg('first_token')}, "
+                f"first spoken {avg('first_spoken')}, total {avg('total')}")
+
+    def _run_turn(self, user_input: str):
+        handled = self._fast_path(user_input)
+        if handled is not None:
+            self._output_response(handled[1])
+            return
+
+        if self.stream:
+            self._stream_turn(user_input)
+            return
+
+        result = self.agent.invoke(
+            {"messages": [{"role": "user", "content": user_input}]},
+            self._config(),
+        )
+
+        reply = result['messages'][-1].content
+        self._output_response(reply)
+
     def run_agent(self):
         # Run the agent
         try:
@@ -69,16 +250,31 @@ class Agent:
                 print(self.prompts['introduction'])
 
             while True:
+                heard = s2t_stats["utterances"]
                 user_input = self._get_user_input()
                 if not user_input:
                     # empty input, skip
                     continue
+                if user_input.strip().lower() in _TRACE_COMMANDS:
+                    print(tracing.summary())
+                    continue
 
-                result = self.agent.invoke(
-                    {"messages": [{"role": "user", "content": user_input}]}
-                )
-
-                reply = result['messages'][-1].content
-                self._output_response(reply)
+                with tracing.span("turn", mode=self.mode, chars=len(user_input)) as turn:
+                    if s2t_stats["utterances"] != heard:
+                        # end of speech to final transcript, measured by s2t
+                        tracing.record("stt", s2t_stats["latency_last"], parent=turn, chars=len(user_input))
+                    self._run_turn(user_input)
         except KeyboardInterrupt:
-            print("Exiting...")
\ No newline at end of file
+            print("Exiting...")
+            if self.stream:
+                print(self.latency_summary())
+            if self.router is not None:
+                print(self.router.summary())
+            print(default_cache.summary())
+            if self.mode in ("speech", "auto") and constants.rec is not None:
+                print(speaker.summary())
+                print(s2t_summary())
+                if self.wake_word:
+                    print(wake_summary())
+            if tracing.enabled:
+                print(tracing.summary())
\ No newline at end of file
@@ -0,0 +1,141 @@
+import json, os, threading, time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+''' Batch mode
+
+Runs every prompt of a JSONL file through the agent with at most `workers`
+turns in flight. Each input line is {"id": ..., "prompt": ...} (the id
+defaults to the line number). Each prompt gets its own session, deleted
+once the item is done, so items are independent; results are appended to
+the output file as they finish, one JSON object per line:
+
+    {"id", "prompt", "status": "ok"|"error", "reply" | "error",
+     "latency", "tools": {name: calls}, "fast_path"}
+
+Items already in the output file with status "ok" are skipped, so an
+interrupted run picks up where it stopped when started again with the same
+arguments.
+'''
+
+
+def read_prompts(path: str) -> list:
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{n}: invalid JSON: {e}") from None
+            if isinstance(item, str):
+                item = {"prompt": item}
+            if not isinstance(item, dict) or not isinstance(item.get("prompt"), str):
+                raise ValueError(f"{path}:{n}: expected an object with a 'prompt' string")
+            items.append({"id": str(item.get("id", n)), "prompt": item["prompt"]})
+    return items
+
+
+def completed_ids(path: str) -> set:
+    """Return ids recorded as done in an earlier run's output file."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # the line being written when the previous run died
+                continue
+            if record.get("status") == "ok":
+                done.add(str(record.get("id")))
+    return done
+
+
+def _percentile(values, p: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class BatchRunner:
+    def __init__(self, agent, output: str, workers: int = 4):
+        self.agent = agent
+        self.output = output
+        self.workers = max(1, workers)
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.tool_calls = {}
+        self.stats = {"ok": 0, "error": 0, "skipped": 0, "fast_path": 0}
+
+    def _run_item(self, item: dict) -> dict:
+        t0 = time.monotonic()
+        record = {"id": item["id"], "prompt": item["prompt"]}
+        session_id = f"batch-{item['id']}"
+        try:
+            result = self.agent.answer(item["prompt"], session_id=session_id)
+            record.update(status="ok", reply=result["reply"], tools=result["tools"], fast_path=result["fast_path"])
+        except Exception as e:
+            record.update(status="error", error=f"{type(e).__name__}: {e}", tools={}, fast_path=False)
+        finally:
+            # items never continue a conversation, so drop the history right away
+            self.agent.agent.checkpointer.delete_thread(session_id)
+        record["latency"] = round(time.monotonic() - t0, 3)
+        return record
+
+    def _write(self, out, record: dict):
+        with self._lock:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            self.stats[record["status"]] += 1
+            self.stats["fast_path"] += record["fast_path"]
+            self.latencies.append(record["latency"])
+            for name, calls in record["tools"].items():
+                self.tool_calls[name] = self.tool_calls.get(name, 0) + calls
+
+    def run(self, items) -> dict:
+        done = completed_ids(self.output)
+        todo = [item for item in items if item["id"] not in done]
+        self.stats["skipped"] = len(items) - len(todo)
+        self._terminate_partial_line()
+        t0 = time.monotonic()
+        try:
+            with open(self.output, "a", encoding="utf-8") as out, \
+                    ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch") as pool:
+                pending = set()
+                # submit lazily so a large input file is not all queued at once
+                for item in todo:
+                    pending.add(pool.submit(self._run_item, item))
+                    if len(pending) >= self.workers * 2:
+                        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for f in finished:
+                            self._write(out, f.result())
+                for f in as_completed(pending):
+                    self._write(out, f.result())
+        finally:
+            self.stats["wall"] = time.monotonic() - t0
+        return self.stats
+
+    def _terminate_partial_line(self):
+        """End a line cut short by a crash so the next record starts on its own line."""
+        if not os.path.exists(self.output) or not os.path.getsize(self.output):
+            return
+        with open(self.output, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+    def summary(self) -> str:
+        with self._lock:
+            s = self.stats
+            done = s["ok"] + s["error"]
+            rate = done / s["wall"] if s.get("wall") else 0.0
+            p50, p95 = _percentile(self.latencies, 50), _percentile(self.latencies, 95)
+            latency = f"p50 {p50:.2f}s, p95 {p95:.2f}s" if self.latencies else "n/a"
+            tools = ", ".join(f"{k} {v}" for k, v in sorted(self.tool_calls.items())) or "none"
+            return (f"batch: {s['ok']} ok, {s['error']} failed, {s['skipped']} already done; "
+                    f"{done} items in {s.get('wall', 0):.1f}s ({rate:.2f}/s), latency {latency}, "
+                    f"{s['fast_path']} on the fast path; tool calls: {tools}")
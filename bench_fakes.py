@@ -0,0 +1,372 @@
+import re, json, time, random, threading, socketserver, email.utils
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+''' Local stand-ins for the benchmark
+
+Everything here listens on 127.0.0.1 (port 0, so several can run at once)
+and answers deterministically, with an optional fixed delay per request to
+model upstream latency:
+
+- FixtureHTTPServer: a DuckDuckGo-style HTML results page, article pages
+  for the results to point at, and a Stooq-style CSV quote endpoint.
+- IMAPStub / SMTPStub: just enough IMAP4rev1 (LOGIN, SELECT/EXAMINE,
+  STATUS, UID SEARCH, UID FETCH of header fields and a body prefix) and
+  SMTP (EHLO, AUTH PLAIN, MAIL/RCPT/DATA) for gmail.py.
+- ScriptedChatModel: a chat model that answers from rules, calls tools
+  when a rule says so and streams its answers with configurable latency.
+'''
+
+_WORDS = ("market rates earnings growth outlook quarter inflation bond yield policy energy chip "
+          "demand supply forecast analyst revenue margin guidance consumer labour housing").split()
+
+
+def _paragraphs(seed: int, count: int) -> list:
+    rnd = random.Random(seed)
+    return [" ".join(rnd.choice(_WORDS) for _ in range(rnd.randint(25, 60))).capitalize() + "."
+            for _ in range(count)]
+
+
+class _Server:
+    """Run a socketserver on a daemon thread; usable as a context manager."""
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# -- HTTP ---------------------------------------------------------------------
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    wbufsize = 64 * 1024   # headers and body in one write, avoiding Nagle/delayed-ACK stalls
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body: str, ctype: str = "text/html; charset=utf-8"):
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        fixture = self.server.fixture
+        if fixture.latency:
+            time.sleep(fixture.latency)
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/html/":
+            q = query.get("q", [""])[0]
+            links = "".join(f'<div class="result"><a class="result__a" href="{fixture.url}/page/{i}">'
+                            f'{q} result {i}</a></div>' for i in range(fixture.results))
+            self._send(f"<html><body>{links}</body></html>")
+        elif url.path.startswith("/page/"):
+            n = int(url.path.rsplit("/", 1)[1] or 0)
+            body = "".join(f"<p>{p}</p>" for p in _paragraphs(n, fixture.paragraphs))
+            self._send(f'<html><head><meta name="description" content="Fixture page {n}">'
+                       f"<script>var x = 1;</script></head><body><h1>Page {n}</h1>{body}</body></html>")
+        elif url.path == "/q/l/":
+            symbols = query.get("s", [""])[0].split()
+            lines = ["Symbol,Date,Time,Open,High,Low,Close,Volume"]
+            for sym in symbols:
+                base = 50 + sum(map(ord, sym)) % 400
+                lines.append(f"{sym.upper()},2025-01-02,22:00:00,{base:.2f},{base * 1.02:.2f},"
+                             f"{base * 0.98:.2f},{base * 1.01:.2f},1234567")
+            self._send("\n".join(lines) + "\n", "text/csv")
+        else:
+            self.send_error(404)
+
+
+class FixtureHTTPServer(_Server):
+    def __init__(self, latency: float = 0.0, results: int = 3, paragraphs: int = 40):
+        self.latency = latency
+        self.results = results
+        self.paragraphs = paragraphs
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _FixtureHandler)
+        self.server.daemon_threads = True
+        self.server.fixture = self
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+
+# -- IMAP -----------------------------------------------------------------------
+
+def make_mailbox(count: int = 200, seed: int = 1) -> list:
+    """Return `count` synthetic messages as dicts with uid, flags and raw RFC 822 bytes."""
+    rnd = random.Random(seed)
+    senders = ["alice@example.com", "bob@example.com", "news@example.org", "billing@example.net"]
+    messages = []
+    for uid in range(1, count + 1):
+        date = email.utils.formatdate(1735689600 + uid * 3600, usegmt=True)
+        body = "\r\n\r\n".join(_paragraphs(uid, 3))
+        raw = (f"From: {rnd.choice(senders)}\r\nTo: me@example.com\r\nSubject: Message {uid}\r\n"
+               f"Date: {date}\r\nContent-Type: text/plain; charset=utf-8\r\n"
+               f"Content-Transfer-Encoding: 7bit\r\n\r\n{body}\r\n").encode()
+        messages.append({"uid": uid, "seen": rnd.random() < 0.7, "raw": raw})
+    return messages
+
+
+class _IMAPHandler(socketserver.StreamRequestHandler):
+    wbufsize = 64 * 1024   # one write per response, flushed after each command
+
+    def _out(self, data: bytes):
+        self.wfile.write(data)
+
+    def _uids(self, spec: str, mailbox) -> list:
+        known = [m["uid"] for m in mailbox]
+        top = known[-1] if known else 0
+        wanted = set()
+        for part in spec.split(","):
+            if ":" in part:
+                lo, hi = part.split(":")
+                lo = int(lo)
+                hi = top if hi == "*" else int(hi)
+                wanted.update(range(lo, hi + 1))
+            else:
+                wanted.add(int(part))
+        return [m for m in mailbox if m["uid"] in wanted]
+
+    def _search(self, criteria: str, mailbox) -> list:
+        result = mailbox
+        tokens = re.findall(r'"[^"]*"|\S+', criteria)
+        i = 0
+        while i < len(tokens):
+            key = tokens[i].upper()
+            if key == "UNSEEN":
+                result = [m for m in result if not m["seen"]]
+            elif key in ("FROM", "SUBJECT", "TEXT", "BODY") and i + 1 < len(tokens):
+                needle = tokens[i + 1].strip('"').lower().encode()
+                result = [m for m in result if needle in m["raw"].lower()]
+                i += 1
+            elif key in ("SINCE", "BEFORE", "ON") and i + 1 < len(tokens):
+                i += 1  # dates are all recent; accept everything
+            i += 1
+        return result
+
+    def _fetch(self, m, seq: int, items: str):
+        header, _, text = m["raw"].partition(b"\r\n\r\n")
+        parts = [f"{seq} FETCH (UID {m['uid']}".encode()]
+        fields = re.search(r"BODY\.PEEK\[HEADER\.FIELDS \(([^)]*)\)\]", items)
+        if fields:
+            wanted = fields.group(1).upper().split()
+            lines = [l for l in header.split(b"\r\n") if l.split(b":", 1)[0].decode().upper() in wanted]
+            block = b"\r\n".join(lines) + b"\r\n\r\n"
+            parts.append(f" BODY[HEADER.FIELDS ({fields.group(1)})] {{{len(block)}}}\r\n".encode() + block)
+        peek = re.search(r"BODY\.PEEK\[TEXT\](?:<0\.(\d+)>)?", items)
+        if peek:
+            body = text[:int(peek.group(1))] if peek.group(1) else text
+            parts.append(f" BODY[TEXT]<0> {{{len(body)}}}\r\n".encode() + body)
+        self._out(b"* " + b"".join(parts) + b")\r\n")
+
+    def handle(self):
+        try:
+            self._serve()
+        except ConnectionError:
+            pass  # client went away (e.g. closed right after LOGOUT)
+
+    def _serve(self):
+        stub = self.server.stub
+        mailbox = None
+        self._out(b"* OK IMAP4rev1 stub ready\r\n")
+        self.wfile.flush()
+        for line in self.rfile:
+            line = line.decode(errors="replace").rstrip("\r\n")
+            if not line:
+                continue
+            if stub.latency:
+                time.sleep(stub.latency)
+            tag, _, rest = line.partition(" ")
+            cmd, _, args = rest.partition(" ")
+            cmd = cmd.upper()
+            if cmd == "UID":
+                cmd, _, args = args.partition(" ")
+                cmd = "UID " + cmd.upper()
+            ok = f"{tag} OK {cmd} completed\r\n".encode()
+            if cmd == "CAPABILITY":
+                self._out(b"* CAPABILITY IMAP4rev1 AUTH=PLAIN\r\n" + ok)
+            elif cmd in ("LOGIN", "NOOP"):
+                self._out(ok)
+            elif cmd == "LOGOUT":
+                self._out(b"* BYE logging out\r\n" + ok)
+                self.wfile.flush()
+                return
+            elif cmd in ("SELECT", "EXAMINE"):
+                mailbox = stub.folders.get(args.strip('"'))
+                if mailbox is None:
+                    self._out(f"{tag} NO no such folder\r\n".encode())
+                else:
+                    uidnext = mailbox[-1]["uid"] + 1 if mailbox else 1
+                    self._out(f"* {len(mailbox)} EXISTS\r\n* 0 RECENT\r\n* OK [UIDVALIDITY 1] ok\r\n"
+                              f"* OK [UIDNEXT {uidnext}] ok\r\n* FLAGS (\\Seen)\r\n".encode()
+                              + f"{tag} OK [READ-ONLY] {cmd} completed\r\n".encode())
+            elif cmd == "STATUS":
+                name = args.split(" ", 1)[0].strip('"')
+                box = stub.folders.get(name, [])
+                uidnext = box[-1]["uid"] + 1 if box else 1
+                self._out(f'* STATUS "{name}" (UIDVALIDITY 1 UIDNEXT {uidnext})\r\n'.encode() + ok)
+            elif cmd in ("UID SEARCH", "SEARCH") and mailbox is not None:
+                criteria = re.sub(r"^CHARSET \S+ ", "", args, flags=re.I)
+                found = self._search(criteria, mailbox)
+                ids = " ".join(str(m["uid"] if cmd == "UID SEARCH" else mailbox.index(m) + 1) for m in found)
+                self._out(f"* SEARCH {ids}\r\n".encode() + ok)
+            elif cmd == "UID FETCH" and mailbox is not None:
+                spec, _, items = args.partition(" ")
+                for m in self._uids(spec, mailbox):
+                    self._fetch(m, mailbox.index(m) + 1, items)
+                self._out(ok)
+            else:
+                self._out(f"{tag} BAD unsupported command {cmd}\r\n".encode())
+            self.wfile.flush()
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class IMAPStub(_Server):
+    """Plain-text (no TLS) IMAP server over an in-memory mailbox."""
+
+    def __init__(self, messages=None, latency: float = 0.0):
+        self.folders = {"INBOX": messages if messages is not None else make_mailbox()}
+        self.latency = latency
+        self.server = _ThreadingTCPServer(("127.0.0.1", 0), _IMAPHandler)
+        self.server.stub = self
+
+
+# -- SMTP -----------------------------------------------------------------------
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    wbufsize = 64 * 1024
+    def _reply(self, text: str):
+        self.wfile.write(text.encode() + b"\r\n")
+        self.wfile.flush()
+
+    def handle(self):
+        try:
+            self._serve()
+        except ConnectionError:
+            pass
+
+    def _serve(self):
+        stub = self.server.stub
+        self._reply("220 smtp stub ready")
+        for line in self.rfile:
+            if stub.latency:
+                time.sleep(stub.latency)
+            cmd = line.decode(errors="replace").strip().split(" ", 1)[0].upper()
+            if cmd in ("EHLO", "HELO"):
+                self._reply("250-localhost\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME")
+            elif cmd == "AUTH":
+                self._reply("235 authenticated")
+            elif cmd in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self._reply("250 OK")
+            elif cmd == "DATA":
+                self._reply("354 end with <CRLF>.<CRLF>")
+                size = 0
+                for data in self.rfile:
+                    if data in (b".\r\n", b".\n"):
+                        break
+                    size += len(data)
+                with stub.lock:
+                    stub.received.append(size)
+                self._reply("250 queued")
+            elif cmd == "QUIT":
+                self._reply("221 bye")
+                return
+            else:
+                self._reply("502 not implemented")
+
+
+class SMTPStub(_Server):
+    """SMTP server that accepts and counts every message."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.received = []
+        self.lock = threading.Lock()
+        self.server = _ThreadingTCPServer(("127.0.0.1", 0), _SMTPHandler)
+        self.server.stub = self
+
+
+# -- chat model -------------------------------------------------------------------
+
+class ScriptedChatModel(BaseChatModel):
+    """Deterministic chat model for benchmarks.
+
+    `rules` is a list of (regex, tool name, args) tried against the latest
+    user message; the first match makes the model call that tool (args may
+    use the match's groups via str.format). Once tool results are in, or
+    when nothing matches, it answers with a short text. `latency` is the
+    time to the first token and `token_latency` the gap between streamed
+    tokens.
+    """
+
+    rules: list = []
+    latency: float = 0.0
+    token_latency: float = 0.0
+    answer_words: int = 30
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-benchmark"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _reply(self, messages) -> AIMessage:
+        last = messages[-1]
+        if isinstance(last, HumanMessage):
+            text = last.content if isinstance(last.content, str) else str(last.content)
+            for pattern, tool, args in self.rules:
+                m = re.search(pattern, text, re.I)
+                if m:
+                    call_args = {k: v.format(*m.groups()) if isinstance(v, str) else v for k, v in args.items()}
+                    return AIMessage(content="", tool_calls=[{"name": tool, "args": call_args,
+                                                              "id": f"call_{len(messages)}"}])
+        seen = sum(len(m.content) for m in messages if isinstance(m, ToolMessage) and isinstance(m.content, str))
+        words = " ".join(_WORDS[i % len(_WORDS)] for i in range(self.answer_words))
+        return AIMessage(content=f"Summary of {seen} characters of tool output: {words}.")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        reply = self._reply(messages)
+        if reply.tool_calls:
+            call = reply.tool_calls[0]
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": 0}]))
+            return
+        for i, word in enumerate(reply.content.split(" ")):
+            if i and self.token_latency:
+                time.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=(" " if i else "") + word))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
@@ -0,0 +1,421 @@
+import argparse, json, os, sys, tempfile, time, wave
+from concurrent.futures import ThreadPoolExecutor
+
+''' Offline benchmark
+
+Runs the tools and full agent turns against the local stand-ins in
+bench_fakes.py, so results do not depend on the network, the mailbox or
+the model provider, and reports throughput and latency percentiles per
+benchmark. A stored baseline (see --save-baseline) is compared against on
+every run; --check exits non-zero when a benchmark regressed.
+
+    python benchmark.py                        # everything, compare with bench_baseline.json
+    python benchmark.py --only search,ag       # group names or prefixes
+    python benchmark.py --save-baseline        # record this machine's numbers
+    python benchmark.py --wav a.wav b.wav --model-path vosk-model   # replay speech through s2t
+    python benchmark.py --only wake --wake-word "hey computer" --model-path vosk-model
+
+Upstream latency is simulated with --http-latency / --imap-latency and the
+model's time to first token / per token with --llm-latency /
+--token-latency, so the numbers isolate our own overhead unless those are
+set.
+
+Every benchmark also checks what it measured (a real reply, non-empty rows),
+so a tool quietly taking its error path cannot pass as a speed-up; a failed
+check is reported and makes the run exit non-zero.
+'''
+
+# Keep every on-disk store of the real app out of the way before importing it.
+_TMP = tempfile.mkdtemp(prefix="bench-")
+os.environ["MAIL_MIRROR_PATH"] = os.path.join(_TMP, "mirror.sqlite")
+os.environ["MARKET_STORE_DIR"] = os.path.join(_TMP, "market")
+os.environ.pop("TOOL_CACHE_PATH", None)
+os.environ["GMAIL_USER"], os.environ["GMAIL_PASS"] = "bench@example.com", "bench"
+
+BASELINE_PATH = "bench_baseline.json"
+TOLERANCE = 0.25        # relative slowdown of p50/p95 flagged as a regression
+MIN_DELTA_MS = 1.0      # ...if it is also at least this many milliseconds
+
+
+def _percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class SanityError(Exception):
+    """A benchmark's operation returned something other than a real result."""
+
+
+_FAILURES = ("Failed", "No ", "Search request failed", "IMAP search failed", "The stock tool requires",
+             "Missing Gmail credentials", "Command timed out")
+
+
+def reply_check(*expected):
+    """Check for tool/agent replies: non-empty, not an error message, containing `expected`."""
+    def check(result):
+        if not isinstance(result, str) or not result.strip():
+            return f"empty result {result!r}"
+        if result.startswith(_FAILURES):
+            return result.splitlines()[0][:120]
+        for text in expected:
+            if text not in result:
+                return f"{text!r} not in {result[:120]!r}"
+        return None
+    return check
+
+
+def measure(op, iterations: int, workers: int = 1, warmup: int = 2, check=None) -> dict:
+    """Call op(i) `iterations` times on `workers` threads; return throughput and latency stats.
+
+    `check(result)` returns a problem description, or None if the result is
+    sane; the first problem raises SanityError.
+    """
+    def run(i):
+        result = op(i)
+        problem = check(result) if check else None
+        if problem:
+            raise SanityError(problem)
+
+    for i in range(warmup):
+        run(-1 - i)
+
+    def timed(i):
+        t0 = time.perf_counter()
+        run(i)
+        return time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    if workers == 1:
+        latencies = [timed(i) for i in range(iterations)]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            latencies = list(pool.map(timed, range(iterations)))
+    wall = time.perf_counter() - t0
+    return {"n": iterations, "workers": workers, "ops_per_s": iterations / wall,
+            **{f"p{p}_ms": _percentile(latencies, p) * 1000 for p in (50, 95, 99)}}
+
+
+# -- benchmarks -------------------------------------------------------------------
+# Each returns {name: stats}; `env` holds the running stand-ins.
+
+SEARCH_QUERIES = ["bond yield outlook", "chip demand forecast", "consumer inflation policy", "housing supply"]
+
+
+def bench_search(env, args) -> dict:
+    import tools
+    search = tools.search_and_scrape.uncached   # measure the fetch, not the cache
+    check = reply_check("Title:")
+    no_page_errors = lambda r: check(r) or ("a page failed to load" if "Error fetching page" in r else None)
+    return {"search_and_scrape": measure(lambda i: search(SEARCH_QUERIES[i % len(SEARCH_QUERIES)]),
+                                         args.iterations, check=no_page_errors)}
+
+
+def bench_market(env, args) -> dict:
+    import numpy as np, pandas as pd
+    import tools, market_store, options_math
+    symbols = ["AAPL", "MSFT", "GOOG", "AMZN", "NVDA", "META", "TSLA", "AMD", "INTC", "IBM"]
+    quote = tools.get_stock_quote.uncached
+    quotes = tools.get_stock_quotes.uncached
+
+    def history(period="1y", **kw):
+        idx = pd.date_range(end=pd.Timestamp.now(tz="America/New_York").normalize(), periods=252, freq="B")
+        close = 100 + np.cumsum(np.random.default_rng(1).normal(0, 1, len(idx)))
+        return pd.DataFrame({"Open": close, "High": close + 1, "Low": close - 1, "Close": close,
+                             "Volume": 1e6}, index=idx)
+
+    store = market_store.MarketStore(os.path.join(_TMP, "bench-store"))
+    store.bars("WARM", "1y", "1d", history)
+
+    def historical_warm(i):
+        bars, tz = store.bars("WARM", "1y", "1d", history)
+        return market_store.bars_to_csv(bars[-30:], tz)
+
+    def historical_cold(i):
+        return store.bars(f"COLD{i + 10}", "1y", "1d", history)[0]
+
+    def csv_rows(csv):
+        rows = csv.splitlines()[1:]
+        if len(rows) != 30:
+            return f"{len(rows)} rows instead of 30"
+        last = history().index[-1].strftime("%Y-%m-%d")
+        return None if rows[-1].startswith(last) else f"last row {rows[-1]!r}, expected {last}"
+
+    strikes = np.linspace(50, 150, 200)
+    spot, expiry = 100.0, 30 / 365
+    calls = options_math.bs_price(spot, strikes, expiry, 0.04, 0.25, True)
+    atm = int(np.argmin(np.abs(strikes - spot)))
+    # the implied vol at the money must recover the volatility the prices were made with
+    iv_ok = lambda g: None if abs(g['iv'][atm] - 0.25) < 1e-3 else f"ATM iv {g['iv'][atm]}"
+
+    return {
+        "get_stock_quote": measure(lambda i: quote(symbols[i % len(symbols)]), args.iterations,
+                                   check=reply_check()),
+        "get_stock_quotes_10": measure(lambda i: quotes(symbols), args.iterations,
+                                       check=lambda r: reply_check("AAPL")(r) or ("missing quotes" if "no data" in r else None)),
+        "historical_warm": measure(historical_warm, args.iterations, check=csv_rows),
+        "historical_cold": measure(historical_cold, args.iterations,
+                                   check=lambda bars: None if len(bars) == len(history()) else f"{len(bars)} bars"),
+        "options_greeks_200": measure(lambda i: options_math.greeks(calls, spot, strikes, expiry, True),
+                                      args.iterations, check=iv_ok),
+    }
+
+
+def bench_mail(env, args) -> dict:
+    import tools
+    summaries = reply_check("From: ", "Subject: ")
+    return {
+        "read_gmail_all": measure(lambda i: tools.read_gmail(criteria="ALL", limit=20), args.iterations,
+                                  check=summaries),
+        "read_gmail_unseen": measure(lambda i: tools.read_gmail(criteria="UNSEEN", limit=20), args.iterations,
+                                     check=summaries),
+        "send_gmail": measure(lambda i: tools.send_gmail("someone@example.com", f"bench {i}", "hello"),
+                              args.iterations, check=reply_check("Email sent")),
+        # the warm-up call syncs the local mirror from the stub
+        "search_mail": measure(lambda i: tools.search_mail(text="bond yield", limit=10), args.iterations,
+                               check=summaries),
+    }
+
+
+AGENT_PROMPTS = [
+    "search the web for bond yields",
+    "what is the price of MSFT",
+    "check my unread mail",
+    "tell me something about markets",
+]
+
+
+def bench_agent(env, args) -> dict:
+    from agent import Agent
+    agent = Agent(router=None)
+    # sequential turns reuse a few sessions so history handling is exercised; concurrent
+    # turns each get their own session, as turns of one session must not overlap
+    turn = lambda i: agent.answer(AGENT_PROMPTS[i % len(AGENT_PROMPTS)], session_id=f"bench-{i % 8}")["reply"]
+    concurrent = lambda i: agent.answer(AGENT_PROMPTS[i % len(AGENT_PROMPTS)], session_id=f"bench-x-{i}")["reply"]
+    stream = lambda i: "".join(v for kind, v in agent.stream_events(AGENT_PROMPTS[i % len(AGENT_PROMPTS)],
+                                                                     session_id=f"bench-stream-{i % 8}")
+                               if kind == "token")
+    check = reply_check()
+    return {
+        "agent_turn": measure(turn, args.iterations, check=check),
+        "agent_turn_stream": measure(stream, args.iterations, check=check),
+        f"agent_turn_x{args.workers}": measure(concurrent, args.iterations * 2, workers=args.workers, check=check),
+    }
+
+
+def bench_s2t(env, args) -> dict:
+    if not args.wav:
+        return {}
+    import numpy as np
+    import constants, voice_control
+    if constants.rec is None and not constants.load_vosk_model(args.model_path):
+        print("s2t: skipped, no VOSK model (use --model-path)")
+        return {}
+    # capture is driven by the replay thread below instead of the microphone
+    voice_control._stream = object()
+    block = constants.blocksize
+    results = {}
+    for path in args.wav:
+        with wave.open(path, "rb") as w:
+            if (w.getframerate(), w.getnchannels(), w.getsampwidth()) != (constants.samplerate, 1, 2):
+                print(f"s2t: skipped {path}: need {constants.samplerate} Hz mono 16-bit PCM")
+                continue
+            audio = w.readframes(w.getnframes())
+        silence = bytes(block * 2)
+        lead = [silence] * 3
+        tail = [silence] * int((constants.trailing_silence + 1.0) * constants.samplerate / block)
+        blocks = lead + [audio[i:i + block * 2] for i in range(0, len(audio), block * 2)] + tail
+        duration = len(audio) / 2 / constants.samplerate
+
+        def replay():
+            for data in blocks:
+                voice_control.callback(np.frombuffer(data, dtype=np.int16), len(data) // 2, None, None)
+                time.sleep(block / constants.samplerate)
+
+        latencies, walls, text = [], [], ""
+        decoded, audio_s = voice_control.s2t_stats["decode_s"], voice_control.s2t_stats["audio_s"]
+        for _ in range(args.wav_repeat):
+            feeder = ThreadPoolExecutor(max_workers=1)
+            t0 = time.perf_counter()
+            feeder.submit(replay)
+            text = voice_control.s2t()
+            walls.append(time.perf_counter() - t0)
+            latencies.append(voice_control.s2t_stats["latency_last"] or 0.0)
+            feeder.shutdown(wait=True)
+        name = f"s2t_{os.path.splitext(os.path.basename(path))[0]}"
+        results[name] = {"n": len(latencies), "workers": 1, "ops_per_s": len(walls) / sum(walls),
+                         "audio_s": duration, "text": text,
+                         "decode_rtf": (voice_control.s2t_stats["decode_s"] - decoded)
+                                       / max(voice_control.s2t_stats["audio_s"] - audio_s, 1e-9),
+                         **{f"p{p}_ms": _percentile(latencies, p) * 1000 for p in (50, 95, 99)}}
+    return results
+
+
+def bench_wake(env, args) -> dict:
+    """Idle cost of waiting for speech: the full recognizer on every block vs the wake gate."""
+    if not args.wake_word:
+        return {}
+    import numpy as np
+    import constants, voice_control
+    if constants.rec is None and not constants.load_vosk_model(args.model_path):
+        print("wake: skipped, no VOSK model (use --model-path)")
+        return {}
+    block = constants.blocksize
+    rng = np.random.default_rng(0)
+    # room noise well below the energy gate, with a short louder sound every ~10 s
+    noise = rng.normal(0, constants.energy_threshold / 5, int(args.idle_seconds * constants.samplerate))
+    for start in range(0, len(noise), 10 * constants.samplerate):
+        noise[start:start + constants.samplerate // 2] *= 15
+    audio = np.clip(noise, -32768, 32767).astype(np.int16).tobytes()
+    blocks = [audio[i:i + block * 2] for i in range(0, len(audio), block * 2)]
+
+    def full(data):
+        # what s2t() does with every block while waiting for speech
+        if not constants.rec.AcceptWaveform(data):
+            constants.rec.PartialResult()
+
+    gate = voice_control.WakeGate(args.wake_word)
+    results = {}
+    for name, feed in (("wake_idle_always_decoding", full), ("wake_idle_gated", gate.feed)):
+        constants.rec.Reset()
+        gate.reset()
+        times = []
+        cpu = time.process_time()
+        for data in blocks:
+            t0 = time.perf_counter()
+            feed(data)
+            times.append(time.perf_counter() - t0)
+        cpu = time.process_time() - cpu
+        results[name] = {"n": len(times), "workers": 1, "ops_per_s": len(times) / sum(times),
+                         "cpu_pct": 100 * cpu / args.idle_seconds,
+                         **{f"p{p}_ms": _percentile(times, p) * 1000 for p in (50, 95, 99)}}
+        print(f"{name}: {results[name]['cpu_pct']:.1f}% of one core over {args.idle_seconds:.0f}s of idle audio")
+    return results
+
+
+BENCHMARKS = {"search": bench_search, "market": bench_market, "mail": bench_mail,
+              "agent": bench_agent, "s2t": bench_s2t, "wake": bench_wake}
+
+
+# -- setup, report ------------------------------------------------------------------
+
+def start_environment(args):
+    """Start the stand-ins and point the app at them."""
+    import imaplib, smtplib
+    import bench_fakes, constants, gmail, tools
+    http = bench_fakes.FixtureHTTPServer(latency=args.http_latency).start()
+    imap = bench_fakes.IMAPStub(latency=args.imap_latency).start()
+    smtp = bench_fakes.SMTPStub(latency=args.imap_latency).start()
+    tools.SEARCH_URL = f"{http.url}/html/"
+    tools.STOOQ_URL = f"{http.url}/q/l/"
+
+    def imap_connect():
+        conn = imaplib.IMAP4("127.0.0.1", imap.port)
+        conn.login(*gmail.credentials())
+        return conn
+
+    def smtp_connect():
+        conn = smtplib.SMTP("127.0.0.1", smtp.port, timeout=20)
+        conn.login(*gmail.credentials())
+        return conn
+
+    gmail.imap_pool = gmail.ConnectionPool(imap_connect, lambda c: c.noop()[0] == 'OK', lambda c: c.logout())
+    gmail.smtp_pool = gmail.ConnectionPool(smtp_connect, lambda c: c.noop()[0] == 250, lambda c: c.quit())
+    constants.gpt_model = bench_fakes.ScriptedChatModel(
+        rules=[
+            (r"search the web for (.+)", "search_and_scrape", {"query": "{0}"}),
+            (r"price of ([A-Z]{1,5})", "get_stock_quote", {"symbol": "{0}"}),
+            (r"unread mail", "read_gmail", {"criteria": "UNSEEN", "limit": 10}),
+        ],
+        latency=args.llm_latency, token_latency=args.token_latency)
+    return {"http": http, "imap": imap, "smtp": smtp}
+
+
+def compare(results: dict, baseline: dict) -> list:
+    """Return (name, metric, baseline ms, now ms) for each regression beyond TOLERANCE."""
+    regressions = []
+    for name, now in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            old, new = before.get(metric), now.get(metric)
+            if old is not None and new is not None and new > old * (1 + TOLERANCE) and new - old >= MIN_DELTA_MS:
+                regressions.append((name, metric, old, new))
+    return regressions
+
+
+def report(results: dict, baseline: dict) -> str:
+    width = max([len(n) for n in results] + [9])
+    lines = [f"{'benchmark':<{width}}  {'n':>4}  {'ops/s':>8}  {'p50 ms':>8}  {'p95 ms':>8}  {'p99 ms':>8}  vs baseline p50"]
+    for name, r in results.items():
+        before = baseline.get(name, {}).get("p50_ms")
+        change = f"{(r['p50_ms'] / before - 1) * 100:+.0f}%" if before else "n/a"
+        lines.append(f"{name:<{width}}  {r['n']:>4}  {r['ops_per_s']:>8.1f}  {r['p50_ms']:>8.2f}  "
+                     f"{r['p95_ms']:>8.2f}  {r['p99_ms']:>8.2f}  {change}")
+    return "\n".join(lines)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Benchmark tools and agent turns against local stand-ins")
+    p.add_argument("--only", help="Comma-separated benchmark groups (or prefixes): " + ", ".join(BENCHMARKS))
+    p.add_argument("--iterations", type=int, default=30, help="Timed calls per benchmark (default 30)")
+    p.add_argument("--workers", type=int, default=4, help="Threads for the concurrent agent benchmark (default 4)")
+    p.add_argument("--http-latency", type=float, default=0.0, help="Seconds added to every fixture HTTP response")
+    p.add_argument("--imap-latency", type=float, default=0.0, help="Seconds added to every IMAP/SMTP command")
+    p.add_argument("--llm-latency", type=float, default=0.0, help="Seconds before the fake model answers")
+    p.add_argument("--token-latency", type=float, default=0.0, help="Seconds between streamed tokens of the fake model")
+    p.add_argument("--wav", nargs="*", default=[], help="16 kHz mono WAV files to replay through s2t")
+    p.add_argument("--wav-repeat", type=int, default=3, help="Replays per WAV file (default 3)")
+    p.add_argument("--model-path", help="VOSK model directory for the s2t and wake benchmarks")
+    p.add_argument("--wake-word", help="Wake phrase for the idle CPU comparison (wake group)")
+    p.add_argument("--idle-seconds", type=float, default=60.0, help="Seconds of idle audio for the wake group (default 60)")
+    p.add_argument("--baseline", default=BASELINE_PATH, help=f"Baseline JSON to compare with (default {BASELINE_PATH})")
+    p.add_argument("--save-baseline", action="store_true", help="Write this run's results to the baseline file")
+    p.add_argument("--check", action="store_true", help="Exit with status 1 if any benchmark regressed")
+    p.add_argument("--json", help="Also write this run's results to this file")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    prefixes = args.only.split(",") if args.only else [""]
+    unknown = [p for p in prefixes if not any(g.startswith(p) for g in BENCHMARKS)]
+    if unknown:
+        sys.exit(f"unknown benchmark group(s): {', '.join(unknown)}")
+    groups = [g for g in BENCHMARKS if any(g.startswith(p) for p in prefixes)]
+
+    env = start_environment(args)
+    results, invalid = {}, []
+    try:
+        for group in groups:
+            try:
+                results.update(BENCHMARKS[group](env, args))
+            except SanityError as e:
+                invalid.append(group)
+                print(f"INVALID {group}: {e}")
+    finally:
+        for server in env.values():
+            server.stop()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print(report(results, baseline))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({**baseline, **results}, f, indent=2)
+        print(f"baseline written to {args.baseline}")
+        return
+    regressions = compare(results, baseline)
+    for name, metric, old, new in regressions:
+        print(f"REGRESSION {name} {metric}: {old:.2f} ms -> {new:.2f} ms")
+    if invalid or (args.check and regressions):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
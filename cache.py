@@ -0,0 +1,216 @@
+import os, sys, json, time, sqlite3, inspect, functools, threading
+from collections import OrderedDict
+
+''' Tool result cache
+
+Results are kept in an in-memory LRU bounded by entry count and bytes, with a
+TTL per tool. If TOOL_CACHE_PATH is set (or enable_disk() is called) entries
+are also written to a small SQLite file so they survive restarts. Identical
+calls that arrive while one is already running wait for that call instead of
+going upstream again.
+'''
+
+MAX_ENTRIES = 512
+MAX_BYTES = 8 * 1024 * 1024
+MAX_DISK_ENTRIES = 5000
+
+
+def _sizeof(value) -> int:
+    if isinstance(value, str):
+        return len(value.encode("utf-8", errors="ignore"))
+    return sys.getsizeof(value)
+
+
+class _Flight:
+    """An upstream call in progress that other callers can wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class _Stats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_time = 0.0
+
+    def saved_seconds(self) -> float:
+        # each hit or coalesced call avoided one average-length upstream call
+        if not self.misses:
+            return 0.0
+        return (self.hits + self.coalesced) * self.upstream_time / self.misses
+
+
+class ResultCache:
+    """TTL + LRU cache with an optional on-disk SQLite backend."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES, path: str = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires, value, size)
+        self._bytes = 0
+        self._inflight = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self.enable_disk(path)
+
+    # -- storage ---------------------------------------------------------
+
+    def enable_disk(self, path: str):
+        """Persist entries to the SQLite file at `path` (created if missing)."""
+        db = sqlite3.connect(path, check_same_thread=False)
+        db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT, expires REAL, used REAL)")
+        db.execute("DELETE FROM entries WHERE expires < ?", (time.time(),))
+        db.commit()
+        with self._lock:
+            self._db = db
+
+    def _get(self, key):
+        """Return (True, value) for a live entry, else (False, None). Caller holds the lock."""
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                return True, entry[1]
+            self._drop(key)
+        if self._db is not None:
+            row = self._db.execute("SELECT value, expires FROM entries WHERE key = ?", (key,)).fetchone()
+            if row and row[1] > now:
+                value = json.loads(row[0])
+                self._put(key, value, row[1])
+                self._db.execute("UPDATE entries SET used = ? WHERE key = ?", (now, key))
+                self._db.commit()
+                return True, value
+        return False, None
+
+    def _put(self, key, value, expires):
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (expires, value, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def set(self, key, value, ttl: float):
+        expires = time.time() + ttl
+        with self._lock:
+            self._put(key, value, expires)
+            if self._db is not None:
+                try:
+                    self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                                     (key, json.dumps(value), expires, time.time()))
+                    self._db.execute("DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                                     (MAX_DISK_ENTRIES,))
+                    self._db.commit()
+                except (TypeError, ValueError, sqlite3.Error):
+                    # unserialisable values simply stay memory-only
+                    pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM entries")
+                self._db.commit()
+
+    # -- calls -----------------------------------------------------------
+
+    def call(self, name: str, key: str, ttl: float, compute, cache_if=None):
+        """Return the cached value for `key`, or run `compute()` once and cache it.
+
+        Concurrent callers with the same key share a single `compute()` call.
+        """
+        with self._lock:
+            stats = self._stats.setdefault(name, _Stats())
+            hit, value = self._get(key)
+            if hit:
+                stats.hits += 1
+                return value
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                stats.misses += 1
+            else:
+                stats.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        started = time.monotonic()
+        try:
+            value = compute()
+            flight.value = value
+            if ttl > 0 and (cache_if is None or cache_if(value)):
+                self.set(key, value, ttl)
+            return value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                stats.upstream_time += time.monotonic() - started
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def stats(self) -> dict:
+        """Return per-tool hit/miss counters plus current cache size."""
+        with self._lock:
+            out = {name: {"hits": s.hits, "misses": s.misses, "coalesced": s.coalesced,
+                          "saved_seconds": round(s.saved_seconds(), 3)}
+                   for name, s in self._stats.items()}
+            out["_size"] = {"entries": len(self._entries), "bytes": self._bytes, "disk": self._db is not None}
+            return out
+
+    def summary(self) -> str:
+        """Return the counters as a short human-readable report."""
+        stats = self.stats()
+        size = stats.pop("_size")
+        lines = [f"cache: {size['entries']} entries, {size['bytes']} bytes{' (+disk)' if size['disk'] else ''}"]
+        for name, s in sorted(stats.items()):
+            lines.append(f"  {name}: {s['hits']} hits, {s['misses']} misses, {s['coalesced']} coalesced, ~{s['saved_seconds']:.1f}s saved")
+        return "\n".join(lines)
+
+
+default_cache = ResultCache(path=os.environ.get("TOOL_CACHE_PATH") or None)
+
+
+def cached(name: str, ttl, cache_if=None, cache: ResultCache = None):
+    """Decorator caching a tool's result under its normalised arguments.
+
+    `ttl` is seconds, or a callable taking the bound arguments dict and
+    returning seconds (e.g. shorter TTLs for intraday intervals). Results for
+    which `cache_if(result)` is false (such as error strings) are not stored.
+    """
+    def deco(fn):
+        sig = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            bound = sig.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            key = name + ":" + json.dumps(arguments, sort_keys=True, default=str)
+            seconds = ttl(arguments) if callable(ttl) else ttl
+            return (cache or default_cache).call(name, key, seconds, lambda: fn(*args, **kwargs), cache_if)
+
+        wrapper.uncached = fn
+        return wrapper
+    return deco
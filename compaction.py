@@ -0,0 +1,133 @@
+import math, threading
+
+''' Tool result compaction
+
+Tool output is measured with a rough token estimate and cut down to a
+budget before it enters the model context: OHLC tables are aggregated into
+fewer, wider bars, option tables keep the strike window around the middle
+(the rows are already the strikes nearest spot, sorted by strike), other
+tables keep their first and last rows, and plain text keeps its head and
+tail. Every cut is marked in the text so the model knows something is
+missing.
+'''
+
+CHARS_PER_TOKEN = 4   # rough estimate for English text and CSV
+DEFAULT_BUDGET = 800
+TOOL_BUDGETS = {
+    "get_historical": 600,
+    "get_options_chain": 900,
+    "get_stock_quotes": 600,
+    "read_gmail": 700,
+    "search_mail": 700,
+    "search_and_scrape": 800,
+    "run_cmd": 800,
+    "check_job": 600,
+}
+TURN_BUDGET = 4000    # tokens of tool output per user turn
+MIN_BUDGET = 100
+
+_lock = threading.Lock()
+stats = {"compacted": 0, "tokens_in": 0, "tokens_out": 0}
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _truncate_text(text: str, budget: int) -> str:
+    keep = budget * CHARS_PER_TOKEN
+    if len(text) <= keep:
+        return text
+    head = text[:keep * 2 // 3]
+    tail = text[-(keep // 3):]
+    omitted = estimate_tokens(text) - estimate_tokens(head + tail)
+    return f"{head}\n… [~{omitted} tokens omitted] …\n{tail}"
+
+
+def _is_table(lines) -> bool:
+    return len(lines) >= 3 and "," in lines[0] and all(l.count(",") == lines[0].count(",") for l in lines[1:])
+
+
+def _aggregate_ohlc(header: str, rows, max_rows: int) -> list:
+    """Merge consecutive Date,Open,High,Low,Close,Volume rows into at most `max_rows` bars."""
+    k = math.ceil(len(rows) / max_rows)
+    out = [header]
+    for i in range(0, len(rows), k):
+        cells = [r.split(",") for r in rows[i:i + k]]
+        date = cells[0][0] if len(cells) == 1 else f"{cells[0][0]}..{cells[-1][0]}"
+        high = max(float(c[2]) for c in cells)
+        low = min(float(c[3]) for c in cells)
+        volume = sum(int(float(c[5])) for c in cells)
+        out.append(f"{date},{cells[0][1]},{high:.2f},{low:.2f},{cells[-1][4]},{volume}")
+    out.append(f"[aggregated {len(rows)} rows into {len(out) - 1} bars of up to {k} rows]")
+    return out
+
+
+def _compact_table(lines, budget: int) -> list:
+    header, rows = lines[0], lines[1:]
+    per_row = max(1.0, estimate_tokens("\n".join(rows)) / len(rows))
+    # leave room for the header and the omission marker
+    max_rows = max(2, int((budget - estimate_tokens(header) - 15) / per_row))
+    if len(rows) <= max_rows:
+        return lines
+    if header.startswith("Date,Open,High,Low,Close"):
+        try:
+            return _aggregate_ohlc(header, rows, max_rows)
+        except (ValueError, IndexError):
+            pass
+    dropped = len(rows) - max_rows
+    if "strike" in header.lower():
+        start = (len(rows) - max_rows) // 2
+        kept = rows[start:start + max_rows]
+        return [header] + kept + [f"[kept the {max_rows} strikes nearest the middle; {dropped} rows omitted]"]
+    head = rows[:max_rows - max_rows // 3]
+    tail = rows[len(rows) - max_rows // 3:] if max_rows // 3 else []
+    return [header] + head + [f"… [{dropped} rows omitted] …"] + tail
+
+
+def compact(text: str, budget: int) -> str:
+    """Return `text` reduced to roughly `budget` tokens (unchanged if it already fits)."""
+    if estimate_tokens(text) <= budget:
+        return text
+    # blocks separated by blank lines (e.g. one table per expiry) share the budget
+    blocks = text.split("\n\n")
+    total = estimate_tokens(text)
+    out = []
+    for block in blocks:
+        share = max(MIN_BUDGET // 2, budget * estimate_tokens(block) // total)
+        lines = block.splitlines()
+        body_start = 1 if len(lines) > 3 and not _is_table(lines) and _is_table(lines[1:]) else 0
+        if _is_table(lines[body_start:]):
+            # keep a title line (e.g. "Calls expiry ...:") above its table
+            out.append("\n".join(lines[:body_start] + _compact_table(lines[body_start:], share)))
+        else:
+            out.append(_truncate_text(block, share))
+    result = "\n\n".join(out)
+    # a last resort for inputs the structured pass could not shrink enough
+    return result if estimate_tokens(result) <= budget * 1.2 else _truncate_text(result, budget)
+
+
+def budget_for(name: str, turn_used: int, calls_in_step: int = 1) -> int:
+    """Tokens this call may use given the tool budget and what the turn has left."""
+    turn_left = max(MIN_BUDGET, (TURN_BUDGET - turn_used) // max(1, calls_in_step))
+    return min(TOOL_BUDGETS.get(name, DEFAULT_BUDGET), turn_left)
+
+
+def compact_result(name: str, text: str, budget: int) -> str:
+    """compact() plus bookkeeping and a marker saying how much was saved."""
+    before = estimate_tokens(text)
+    if before <= budget:
+        return text
+    result = compact(text, budget)
+    after = estimate_tokens(result)
+    with _lock:
+        stats["compacted"] += 1
+        stats["tokens_in"] += before
+        stats["tokens_out"] += after
+    return f"{result}\n[{name} output compacted from ~{before} to ~{after} tokens]"
+
+
+def summary() -> str:
+    with _lock:
+        saved = stats["tokens_in"] - stats["tokens_out"]
+        return f"compaction: {stats['compacted']} results compacted, ~{saved} tokens saved"
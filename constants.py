@@ -1,29 +1,22 @@
-import queue, os
-from vosk import Model, KaldiRecognizer
+import os, threading
+from startup import lazy_import, timed
+
+vosk = lazy_import("vosk")
 
 path = "/".join(os.path.abspath(__file__).split("/")[:-1])
 MODEL_PATH = f"{path}/vosk-model-en-us-0.22-lgraph"  # unpacked folder
-# Try to load the VOSK model but fail gracefully if it's missing or invalid
+# The VOSK model is large, so it is only loaded when speech is requested
+# (see load_vosk_model / load_vosk_model_async, called from main.py).
 model = None
 rec = None
-try:
-	model = Model(MODEL_PATH)
-except Exception as e:
-	# Don't raise here; let the rest of the program run without speech recognition.
-	# Print a concise warning so the user knows why speech features are disabled.
-	print(f"Warning: failed to load VOSK model at {MODEL_PATH}: {e}")
 
 samplerate = 16000
-blocksize = 8000
+blocksize = 1600         # 100 ms frames
 channels = 1
-
-if model is not None:
-	try:
-		rec = KaldiRecognizer(model, samplerate)
-	except Exception as e:
-		print(f"Warning: failed to create KaldiRecognizer: {e}")
-
-q = queue.Queue()
+energy_threshold = 500   # int16 RMS above which a frame counts as speech
+barge_in_threshold = 1500  # ...while a reply is playing, so its echo does not count
+trailing_silence = 0.6   # seconds of silence after speech that end an utterance
+max_queue_blocks = 50    # audio frames buffered (voice_control's ring) before the oldest are dropped
 
 gpt_model = "openai:gpt-5-nano"
 
@@ -37,9 +30,10 @@ def load_vosk_model(path=None):
 	global model, rec, MODEL_PATH
 	mp = path or MODEL_PATH
 	try:
-		model = Model(mp)
-		# ensure samplerate variable exists
-		rec = KaldiRecognizer(model, samplerate)
+		with timed("vosk model load"):
+			model = vosk.Model(mp)
+			# ensure samplerate variable exists
+			rec = vosk.KaldiRecognizer(model, samplerate)
 		MODEL_PATH = mp
 		print(f"Loaded VOSK model from {mp}")
 		return True
@@ -47,4 +41,15 @@ def load_vosk_model(path=None):
 		print(f"Error loading VOSK model from {mp}: {e}")
 		model = None
 		rec = None
-		return False
\ No newline at end of file
+		return False
+
+
+def load_vosk_model_async(path=None):
+	"""Start load_vosk_model() on a background thread and return the thread.
+
+	Lets speech resources warm up while the agent is being built; join the
+	thread before relying on `rec`.
+	"""
+	t = threading.Thread(target=load_vosk_model, args=(path,), name="vosk-load", daemon=True)
+	t.start()
+	return t
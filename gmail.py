@@ -0,0 +1,223 @@
+import os, re, time, email, imaplib, smtplib, threading
+from contextlib import contextmanager
+from email.header import decode_header, make_header
+
+''' Gmail connections
+
+Authenticated IMAP and SMTP connections are kept in small pools and reused
+across tool calls. A connection that has been idle for a while is checked
+with NOOP before it is handed out, and dropped if the check fails or it has
+been idle longer than the server is likely to keep it open.
+
+Message listings are fetched with a single UID FETCH for the whole range,
+asking only for the summary headers and the first TEXT_PEEK_BYTES of the body.
+'''
+
+IMAP_HOST = 'imap.gmail.com'
+SMTP_HOST, SMTP_PORT = 'smtp.gmail.com', 587
+POOL_SIZE = 2
+CHECK_AFTER = 30          # seconds idle before a NOOP health check
+IMAP_MAX_IDLE = 25 * 60   # Gmail drops idle IMAP sessions after ~30 minutes
+SMTP_MAX_IDLE = 4 * 60    # and idle SMTP sessions much sooner
+TEXT_PEEK_BYTES = 2048
+HEADER_FIELDS = 'FROM SUBJECT DATE CONTENT-TYPE CONTENT-TRANSFER-ENCODING'
+
+MISSING_CREDENTIALS = ("Missing Gmail credentials. Set environment variables GMAIL_USER and GMAIL_PASS.\n"
+                       "If you use 2FA, create an app password in your Google Account and use it as GMAIL_PASS.")
+
+
+def credentials():
+    """Return (user, password) from GMAIL_USER / GMAIL_PASS, or None if unset."""
+    user = os.environ.get("GMAIL_USER")
+    password = os.environ.get("GMAIL_PASS")
+    if not user or not password:
+        return None
+    return user, password
+
+
+class ConnectionPool:
+    """Bounded pool of reusable, health-checked connections."""
+
+    def __init__(self, connect, check, close, size: int = POOL_SIZE, max_idle: float = 300):
+        self._connect = connect
+        self._check = check
+        self._close = close
+        self._max_idle = max_idle
+        self._idle = []  # (connection, last used)
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "reused": 0, "discarded": 0}
+
+    def _acquire(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, last_used = self._idle.pop()
+            idle = time.monotonic() - last_used
+            if idle < self._max_idle and (idle < CHECK_AFTER or self._healthy(conn)):
+                self.stats["reused"] += 1
+                return conn
+            self._discard(conn)
+        self.stats["created"] += 1
+        return self._connect()
+
+    def _healthy(self, conn) -> bool:
+        try:
+            return self._check(conn)
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        self.stats["discarded"] += 1
+        try:
+            self._close(conn)
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """Yield a connection; it goes back to the pool unless the body raised a connection error."""
+        self._slots.acquire()
+        conn = None
+        try:
+            conn = self._acquire()
+            yield conn
+        except (imaplib.IMAP4.abort, smtplib.SMTPServerDisconnected, OSError):
+            if conn is not None:
+                self._discard(conn)
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+            self._slots.release()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+
+def _imap_connect():
+    user, password = credentials()
+    imap = imaplib.IMAP4_SSL(IMAP_HOST)
+    imap.login(user, password)
+    return imap
+
+
+def _smtp_connect():
+    user, password = credentials()
+    smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=20)
+    smtp.ehlo()
+    smtp.starttls()
+    smtp.login(user, password)
+    return smtp
+
+
+imap_pool = ConnectionPool(_imap_connect, lambda c: c.noop()[0] == 'OK', lambda c: c.logout(), max_idle=IMAP_MAX_IDLE)
+smtp_pool = ConnectionPool(_smtp_connect, lambda c: c.noop()[0] == 250, lambda c: c.quit(), max_idle=SMTP_MAX_IDLE)
+
+
+def send_messages(messages, from_addr: str) -> None:
+    """Send (EmailMessage, recipients) pairs over one pooled, authenticated SMTP session."""
+    with smtp_pool.connection() as smtp:
+        for msg, recipients in messages:
+            smtp.send_message(msg, from_addr=from_addr, to_addrs=recipients)
+
+
+def _header(value) -> str:
+    try:
+        return str(make_header(decode_header(value or '')))
+    except Exception:
+        return value or ''
+
+
+def _snippet(msg, limit: int) -> str:
+    snippet = ''
+    if msg.is_multipart():
+        for part in msg.walk():
+            ctype = part.get_content_type()
+            if ctype == 'text/plain' and not part.get('Content-Disposition'):
+                try:
+                    snippet = part.get_payload(decode=True).decode(errors='ignore').strip()
+                    break
+                except Exception:
+                    continue
+    else:
+        try:
+            snippet = msg.get_payload(decode=True).decode(errors='ignore').strip()
+        except Exception:
+            snippet = ''
+    return (snippet or '')[:limit].replace('\r', '').replace('\n', ' ')
+
+
+def parse_fetch(data) -> list:
+    """Group a UID FETCH response into [{'uid', 'header', 'text'}] in server order."""
+    messages = []
+    current = None
+    for item in data:
+        meta = item[0] if isinstance(item, tuple) else item
+        if not isinstance(meta, bytes):
+            continue
+        if re.match(rb'\s*\d+ \(', meta):
+            current = {'uid': None, 'header': b'', 'text': b''}
+            messages.append(current)
+        if current is None:
+            continue
+        uid = re.search(rb'UID (\d+)', meta)
+        if uid:
+            current['uid'] = int(uid.group(1))
+        if isinstance(item, tuple):
+            if b'HEADER' in meta:
+                current['header'] = item[1]
+            elif b'BODY[TEXT]' in meta:
+                current['text'] = item[1]
+    return messages
+
+
+def fetch_uids(imap, uids, snippet_len: int = 400) -> list:
+    """Fetch summary dicts for `uids` (in the selected folder) with one UID FETCH."""
+    if not uids:
+        return []
+    uid_set = b','.join(u if isinstance(u, bytes) else str(u).encode() for u in uids)
+    typ, data = imap.uid('FETCH', uid_set,
+                         f'(UID BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})] BODY.PEEK[TEXT]<0.{TEXT_PEEK_BYTES}>)')
+    if typ != 'OK':
+        raise imaplib.IMAP4.error(f"UID FETCH failed: {typ}")
+    out = []
+    for m in parse_fetch(data):
+        # headers carry the MIME type, so the truncated body still decodes
+        msg = email.message_from_bytes(m['header'].rstrip(b'\r\n') + b'\r\n\r\n' + m['text'])
+        out.append({
+            'uid': m['uid'],
+            'from': _header(msg.get('From', '')),
+            'subject': _header(msg.get('Subject', '(no subject)')),
+            'date': msg.get('Date', ''),
+            'snippet': _snippet(msg, snippet_len),
+        })
+    return out
+
+
+def fetch_summaries(imap, folder: str, criteria: str, limit: int, snippet_len: int = 400):
+    """Return up to `limit` newest matching messages as dicts, newest first.
+
+    Returns None when the search itself fails.
+    """
+    imap.select(folder, readonly=True)
+    typ, data = imap.uid('SEARCH', None, criteria)
+    if typ != 'OK':
+        return None
+    try:
+        out = fetch_uids(imap, data[0].split()[-limit:], snippet_len)
+    except imaplib.IMAP4.error:
+        return None
+    out.sort(key=lambda m: m['uid'] or 0, reverse=True)
+    return out
+
+
+def format_summaries(summaries) -> str:
+    return "\n\n".join(f"From: {m['from']}\nSubject: {m['subject']}\nDate: {m['date']}\nSnippet: {m['snippet']}"
+                       for m in summaries)
@@ -0,0 +1,244 @@
+import os, shlex, imaplib, sqlite3, threading, time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import gmail
+
+''' Local mailbox mirror
+
+Message headers and text snippets are copied into a SQLite database with an
+FTS5 index so sender / date / free-text questions are answered locally.
+Sync is incremental: the folder's UIDVALIDITY and UIDNEXT are compared with
+what was stored and only UIDs above the highest mirrored one are fetched (a
+UIDVALIDITY change discards the folder and starts over). Messages deleted on
+the server are pruned on each sync. Flags are not mirrored, so criteria such
+as UNSEEN always go to IMAP.
+
+read_gmail only answers from the mirror when it holds every message of the
+folder (the first sync keeps just the newest INITIAL_SYNC_LIMIT) and the
+criteria mean the same thing locally: FROM, SUBJECT, SINCE and BEFORE.
+TEXT/BODY search whole messages on the server but only snippets here, so
+they stay on IMAP; search_mail is the explicitly approximate local search.
+'''
+
+MIRROR_PATH = os.environ.get("MAIL_MIRROR_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".mail_mirror.sqlite")
+INITIAL_SYNC_LIMIT = 2000   # newest messages fetched on first sync of a folder
+FETCH_BATCH = 200           # UIDs per UID FETCH
+FRESH_FOR = 120             # seconds a sync counts as fresh for read_gmail
+REFRESH_EVERY = 300         # background refresh interval
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (name TEXT PRIMARY KEY, uidvalidity INTEGER, uidnext INTEGER, synced_at REAL,
+                                    complete INTEGER DEFAULT 0);
+CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY, folder TEXT, uid INTEGER, sender TEXT, subject TEXT,
+                                     date TEXT, date_ts REAL, snippet TEXT, UNIQUE (folder, uid));
+CREATE INDEX IF NOT EXISTS messages_date ON messages (folder, date_ts);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5 (sender, subject, snippet);
+"""
+
+
+def _timestamp(date: str):
+    try:
+        dt = parsedate_to_datetime(date)
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.timestamp()
+    except Exception:
+        return None
+
+
+def _day(value: str) -> float:
+    """Parse 'YYYY-MM-DD' or IMAP-style 'DD-Mon-YYYY' into a UTC timestamp."""
+    for fmt in ("%Y-%m-%d", "%d-%b-%Y"):
+        try:
+            return datetime.strptime(value, fmt).replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date {value!r}; use YYYY-MM-DD")
+
+
+def _fts_query(text: str, column: str = None) -> str:
+    # quote every term so user input is never parsed as FTS syntax
+    terms = ['"' + w.replace('"', '""') + '"' for w in text.split()]
+    if column:
+        terms = [f"{column} : {t}" for t in terms]
+    return " AND ".join(terms)
+
+
+def criteria_to_query(criteria: str):
+    """Translate simple IMAP search criteria into query() keyword arguments.
+
+    Supports ALL, FROM, SUBJECT, SINCE and BEFORE; returns None for anything
+    else (e.g. UNSEEN, or TEXT/BODY, which search more than the mirror
+    keeps), which must go to the server.
+    """
+    try:
+        tokens = shlex.split(criteria or "ALL")
+    except ValueError:
+        return None
+    query, subject = {}, []
+    i = 0
+    while i < len(tokens):
+        key = tokens[i].upper()
+        if key == "ALL":
+            i += 1
+            continue
+        if i + 1 >= len(tokens):
+            return None
+        value = tokens[i + 1]
+        if key == "FROM":
+            query["sender"] = value
+        elif key == "SINCE":
+            query["since"] = value
+        elif key == "BEFORE":
+            query["until"] = value
+        elif key == "SUBJECT":
+            subject.append(value)
+        else:
+            return None
+        i += 2
+    if subject:
+        query["subject"] = " ".join(subject)
+    return query
+
+
+class MailMirror:
+    def __init__(self, path: str = MIRROR_PATH):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        if "complete" not in [r[1] for r in self._db.execute("PRAGMA table_info(folders)")]:
+            # mirror created before completeness was tracked: unknown until the next sync
+            self._db.execute("ALTER TABLE folders ADD COLUMN complete INTEGER DEFAULT 0")
+        self._lock = threading.Lock()
+        self._refresher = None
+
+    def _folder_state(self, folder: str):
+        return self._db.execute("SELECT uidvalidity, uidnext, synced_at FROM folders WHERE name = ?", (folder,)).fetchone()
+
+    def _delete(self, where: str, args):
+        ids = [r[0] for r in self._db.execute(f"SELECT id FROM messages WHERE {where}", args)]
+        self._db.executemany("DELETE FROM messages_fts WHERE rowid = ?", [(i,) for i in ids])
+        self._db.executemany("DELETE FROM messages WHERE id = ?", [(i,) for i in ids])
+        return len(ids)
+
+    def _insert(self, folder: str, summaries):
+        for m in summaries:
+            if m['uid'] is None:
+                continue
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO messages (folder, uid, sender, subject, date, date_ts, snippet) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (folder, m['uid'], m['from'], m['subject'], m['date'], _timestamp(m['date']), m['snippet']))
+            if cur.rowcount:
+                self._db.execute("INSERT INTO messages_fts (rowid, sender, subject, snippet) VALUES (?, ?, ?, ?)",
+                                 (cur.lastrowid, m['from'], m['subject'], m['snippet']))
+
+    def sync(self, folder: str = 'INBOX') -> int:
+        """Bring `folder` up to date with the server; return the number of new messages."""
+        with gmail.imap_pool.connection() as imap:
+            typ, data = imap.status(folder, '(UIDVALIDITY UIDNEXT)')
+            if typ != 'OK':
+                raise imaplib.IMAP4.error(f"STATUS {folder} failed: {typ}")
+            status = data[0].decode(errors='ignore').upper().replace('(', ' ').replace(')', ' ').split()
+            uidvalidity = int(status[status.index('UIDVALIDITY') + 1])
+            uidnext = int(status[status.index('UIDNEXT') + 1])
+
+            with self._lock:
+                state = self._folder_state(folder)
+                if state and state[0] != uidvalidity:
+                    self._delete("folder = ?", (folder,))
+                    state = None
+                last_uid = self._db.execute("SELECT MAX(uid) FROM messages WHERE folder = ?", (folder,)).fetchone()[0] or 0
+
+            imap.select(folder, readonly=True)
+            typ, data = imap.uid('SEARCH', None, 'ALL')
+            if typ != 'OK':
+                raise imaplib.IMAP4.error(f"UID SEARCH {folder} failed: {typ}")
+            server_uids = [int(u) for u in data[0].split()]
+            new = [u for u in server_uids if u > last_uid]
+            if not state:
+                new = new[-INITIAL_SYNC_LIMIT:]
+            fetched = []
+            if state is None or state[1] != uidnext:
+                for i in range(0, len(new), FETCH_BATCH):
+                    fetched.extend(gmail.fetch_uids(imap, new[i:i + FETCH_BATCH]))
+
+        with self._lock:
+            self._insert(folder, fetched)
+            # prune what the server no longer has
+            known = set(server_uids)
+            gone = [u for (u,) in self._db.execute("SELECT uid FROM messages WHERE folder = ?", (folder,)) if u not in known]
+            for u in gone:
+                self._delete("folder = ? AND uid = ?", (folder, u))
+            mirrored = self._db.execute("SELECT COUNT(*) FROM messages WHERE folder = ?", (folder,)).fetchone()[0]
+            self._db.execute("INSERT OR REPLACE INTO folders (name, uidvalidity, uidnext, synced_at, complete) "
+                             "VALUES (?, ?, ?, ?, ?)",
+                             (folder, uidvalidity, uidnext, time.time(), int(mirrored >= len(server_uids))))
+            self._db.commit()
+        return len(fetched)
+
+    def is_fresh(self, folder: str = 'INBOX', max_age: float = FRESH_FOR) -> bool:
+        with self._lock:
+            state = self._folder_state(folder)
+        return bool(state) and time.time() - state[2] < max_age
+
+    def covers(self, folder: str = 'INBOX', max_age: float = FRESH_FOR) -> bool:
+        """Whether `folder` is fresh and holds every message the server had at the last sync."""
+        with self._lock:
+            row = self._db.execute("SELECT synced_at, complete FROM folders WHERE name = ?", (folder,)).fetchone()
+        return bool(row) and bool(row[1]) and time.time() - row[0] < max_age
+
+    def query(self, folder: str = 'INBOX', sender: str = None, since: str = None, until: str = None,
+              text: str = None, subject: str = None, limit: int = 10) -> list:
+        """Return matching mirrored messages, newest first, as gmail summary dicts.
+
+        `text` matches sender, subject and snippet; `subject` only the subject.
+        """
+        sql = "SELECT m.uid, m.sender, m.subject, m.date, m.snippet FROM messages m"
+        where, args = ["m.folder = ?"], [folder]
+        match = [q for q in (text and _fts_query(text), subject and _fts_query(subject, "subject")) if q]
+        if match:
+            sql += " JOIN messages_fts f ON f.rowid = m.id"
+            where.append("messages_fts MATCH ?")
+            args.append(" AND ".join(match))
+        if sender:
+            where.append("m.sender LIKE ?")
+            args.append(f"%{sender}%")
+        if since:
+            where.append("m.date_ts >= ?")
+            args.append(_day(since))
+        if until:
+            where.append("m.date_ts < ?")
+            args.append(_day(until))
+        sql += " WHERE " + " AND ".join(where) + " ORDER BY m.date_ts DESC, m.uid DESC LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        return [{'uid': r[0], 'from': r[1], 'subject': r[2], 'date': r[3], 'snippet': r[4]} for r in rows]
+
+    def start_background_refresh(self, folder: str = 'INBOX', every: float = REFRESH_EVERY):
+        """Keep `folder` synced from a daemon thread (idempotent)."""
+        if self._refresher is not None:
+            return
+
+        def loop():
+            while True:
+                try:
+                    self.sync(folder)
+                except Exception:
+                    # transient network/auth errors: try again next round
+                    pass
+                time.sleep(every)
+
+        self._refresher = threading.Thread(target=loop, name="mail-mirror", daemon=True)
+        self._refresher.start()
+
+
+_mirror = None
+_mirror_lock = threading.Lock()
+
+
+def default_mirror() -> MailMirror:
+    global _mirror
+    with _mirror_lock:
+        if _mirror is None:
+            _mirror = MailMirror()
+        return _mirror
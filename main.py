@@ -1,34 +1,93 @@
 import argparse, sys
 
-import constants
+from startup import timed, report
+
+with timed("import constants"):
+	import constants
 
 def parse_args():
 	p = argparse.ArgumentParser(description="Run the automation agent in speech or text mode")
-	p.add_argument("--mode", choices=["speech", "text", "auto"], default="text",
-		           help="Operation mode: 'speech' to use microphone (requires a VOSK model), 'text' to use typed input (default), 'auto' to use speech if available else text")
+	p.add_argument("--mode", choices=["speech", "text", "auto", "batch", "serve"], default="text",
+		           help="Operation mode: 'speech' to use microphone (requires a VOSK model), 'text' to use typed input (default), 'auto' to use speech if available else text, 'batch' to run the prompts of --input unattended, 'serve' to host WebSocket sessions")
 	p.add_argument("--model-path", help="Optional path to VOSK model directory to use when --mode=speech or when loading in auto mode")
-	return p.parse_args()
+	p.add_argument("--wake-word", metavar="PHRASE",
+		           help="Speech/auto mode: stay idle (low CPU) until PHRASE is heard, then listen for the command; its words must be in the VOSK model's vocabulary")
+	p.add_argument("--pretranscribe", action="store_true",
+		           help="Speech/auto mode: keep transcribing while a reply is produced, so the next command can be spoken before it ends")
+	p.add_argument("--input", help="Batch mode: JSONL file of {\"id\": ..., \"prompt\": ...} lines")
+	p.add_argument("--output", help="Batch mode: JSONL file results are appended to; items already done in it are skipped")
+	p.add_argument("--workers", type=int, default=4, help="Batch mode: number of prompts run concurrently (default 4)")
+	p.add_argument("--host", default="127.0.0.1", help="Serve mode: address to listen on (default 127.0.0.1)")
+	p.add_argument("--port", type=int, default=8765, help="Serve mode: port to listen on (default 8765)")
+	p.add_argument("--max-turns", type=int, default=8, help="Serve mode: turns (model calls) run concurrently (default 8)")
+	p.add_argument("--stream", action="store_true",
+		           help="Print tokens and speak sentences as the reply streams in instead of waiting for the full reply")
+	p.add_argument("--no-fast-path", action="store_true",
+		           help="Send every input to the LLM instead of answering simple commands (quotes, weather, mail) directly")
+	p.add_argument("--trace", nargs="?", const="", metavar="PATH",
+		           help="Record per-turn spans (STT, LLM, tools, TTS) to a JSONL file (default .trace.jsonl); type /trace for a latency summary")
+	p.add_argument("--profile-startup", action="store_true",
+		           help="Print import and load times per component before starting the agent")
+	args = p.parse_args()
+	if args.mode == "batch" and not (args.input and args.output):
+		p.error("--mode batch requires --input and --output")
+	return args
 
 
 def main():
 	args = parse_args()
 
-	if args.mode == "speech":
-		# Try to load model (may have already been attempted at import time). If it fails, exit with error.
-		ok = constants.load_vosk_model(args.model_path) if hasattr(constants, 'load_vosk_model') else False
-		if not ok and constants.rec is None:
+	# Speech resources warm up on a background thread while the agent is built.
+	loader = None
+	if args.mode in ("speech", "auto"):
+		loader = constants.load_vosk_model_async(args.model_path)
+
+	if args.trace is not None:
+		import tracing
+		tracing.enable(args.trace or tracing.TRACE_PATH)
+
+	with timed("import tools"):
+		import tools
+	with timed("import voice_control"):
+		import voice_control
+	with timed("import agent"):
+		from agent import Agent
+		from router import default_router
+	with timed("build agent"):
+		agent = Agent(mode=args.mode, stream=args.stream, router=None if args.no_fast_path else default_router,
+		              wake_word=args.wake_word, pretranscribe=args.pretranscribe)
+
+	if loader is not None:
+		with timed("wait for vosk model"):
+			loader.join()
+		if args.mode == "speech" and constants.rec is None:
 			print("Error: speech mode requested but VOSK model could not be loaded. Provide a valid --model-path or install a model at the default path.")
 			sys.exit(1)
-	elif args.mode == "auto":
-		# If recognizer not loaded yet, try to load if a model path was provided.
-		if constants.rec is None and args.model_path:
-			constants.load_vosk_model(args.model_path)
-		if constants.rec is None:
+		if args.mode == "auto" and constants.rec is None:
 			print("Auto mode: speech recognizer not available, falling back to text mode.")
 
-	# Import Agent and run after we attempted any model loading above.
-	from agent import Agent
-	Agent(mode=args.mode).run_agent()
+	if args.profile_startup:
+		print(report())
+
+	if args.mode == "batch":
+		from batch import BatchRunner, read_prompts
+		runner = BatchRunner(agent, args.output, args.workers)
+		try:
+			runner.run(read_prompts(args.input))
+		finally:
+			print(runner.summary())
+		return
+
+	if args.mode == "serve":
+		import asyncio
+		from server import AgentServer
+		try:
+			asyncio.run(AgentServer(agent, args.max_turns).serve(args.host, args.port))
+		except KeyboardInterrupt:
+			print("Exiting...")
+		return
+
+	agent.run_agent()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,231 @@
+import os, re, json, time, threading
+import numpy as np, pandas as pd
+
+''' Local OHLCV store
+
+One memory-mapped NumPy file per symbol/interval holding a structured array
+of bars (UTC nanosecond timestamps + OHLCV), plus a small JSON sidecar with
+the exchange timezone, how far back the data is known to be complete and when
+the tail was last refreshed. Only the missing tail (or, for a longer period
+than ever fetched, the whole period) is requested upstream.
+
+Like yfinance, '1d' and '5d' count trading sessions, not calendar days: they
+are served as the last one or five session dates in the store. The other
+periods are calendar spans.
+'''
+
+BAR_DTYPE = np.dtype([('ts', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'),
+                      ('close', '<f8'), ('volume', '<f8')])
+
+STORE_DIR = os.environ.get("MARKET_STORE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".market_store")
+
+# How long a stored tail is considered fresh, per interval (seconds).
+REFRESH = {'1m': 60, '2m': 120, '5m': 300, '15m': 900, '30m': 1800, '60m': 3600, '90m': 3600, '1h': 3600}
+DEFAULT_REFRESH = 3600
+
+# How long bars are kept by compact(), per interval. Intervals not listed are kept forever.
+RETENTION = {'1m': 7 * 86400, '2m': 60 * 86400, '5m': 60 * 86400, '15m': 60 * 86400,
+             '30m': 60 * 86400, '60m': 730 * 86400, '90m': 60 * 86400, '1h': 730 * 86400}
+
+_SESSIONS = {'1d': 1, '5d': 5}
+_PERIODS = {'1d': 1, '5d': 5, '1mo': 31, '3mo': 92, '6mo': 183, '1y': 366, '2y': 731, '5y': 1827, '10y': 3653}
+
+
+def period_start(period: str, now: float = None) -> int:
+    """Return the UTC nanosecond timestamp at which `period` begins."""
+    now = time.time() if now is None else now
+    if period == 'max':
+        return 0
+    if period == 'ytd':
+        return pd.Timestamp(time.gmtime(now).tm_year, 1, 1, tz='UTC').value
+    days = _PERIODS.get(period)
+    if days is None:
+        raise ValueError(f"Unsupported period {period!r}")
+    return int((now - days * 86400) * 1e9)
+
+
+def _utc(ts):
+    return pd.to_datetime(ts, unit='ns', utc=True)
+
+
+def frame_to_bars(df) -> tuple:
+    """Convert a yfinance history DataFrame into (bars, timezone name)."""
+    idx = pd.DatetimeIndex(df.index)
+    tz = str(idx.tz) if idx.tz is not None else 'UTC'
+    # yfinance indexes come in [s] or [us] resolution under pandas 3; store nanoseconds
+    idx = idx.tz_convert('UTC') if idx.tz is not None else idx.tz_localize('UTC')
+    bars = np.empty(len(df), dtype=BAR_DTYPE)
+    bars['ts'] = idx.as_unit('ns').asi8
+    for col in ('open', 'high', 'low', 'close', 'volume'):
+        bars[col] = df[col.capitalize()].to_numpy(dtype='f8', na_value=np.nan)
+    return bars, tz
+
+
+def session_start(bars, sessions: int, tz: str = 'UTC') -> int:
+    """Return the index of the first bar of the last `sessions` trading dates in `bars`."""
+    if not len(bars):
+        return 0
+    dates = _utc(bars['ts']).tz_convert(tz).normalize().asi8
+    unique = np.unique(dates)
+    first = unique[max(0, len(unique) - sessions)]
+    return int(np.searchsorted(dates, first))
+
+
+def merge_bars(old, new):
+    """Merge two bar arrays by timestamp; bars in `new` win on duplicates."""
+    combined = np.concatenate([old, new])
+    combined = combined[np.argsort(combined['ts'], kind='stable')]
+    keep = np.ones(len(combined), dtype=bool)
+    keep[:-1] = combined['ts'][1:] != combined['ts'][:-1]
+    return combined[keep]
+
+
+def bars_to_csv(bars, tz: str = 'UTC') -> str:
+    """Format bars as "Date,Open,High,Low,Close,Volume" CSV without a Python row loop."""
+    dates = _utc(bars['ts']).tz_convert(tz).strftime('%Y-%m-%d %H:%M')
+    df = pd.DataFrame({
+        'Date': dates,
+        'Open': bars['open'], 'High': bars['high'], 'Low': bars['low'], 'Close': bars['close'],
+        'Volume': np.nan_to_num(bars['volume']).astype('i8'),
+    })
+    return df.to_csv(index=False, float_format='%.2f', lineterminator='\n').rstrip('\n')
+
+
+class MarketStore:
+    """Per-symbol/per-interval bar files under `root`."""
+
+    def __init__(self, root: str = STORE_DIR):
+        self.root = root
+        self._lock = threading.Lock()   # guards _locks only
+        self._locks = {}
+
+    def _key_lock(self, symbol: str, interval: str) -> threading.Lock:
+        """One lock per file, so fetches for different symbols run concurrently."""
+        key = self._paths(symbol, interval)[0]
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _paths(self, symbol: str, interval: str):
+        name = re.sub(r'[^A-Za-z0-9._-]', '_', symbol.upper()) + '_' + interval
+        base = os.path.join(self.root, name)
+        return base + '.npy', base + '.json'
+
+    def _read(self, symbol: str, interval: str):
+        data_path, meta_path = self._paths(symbol, interval)
+        if not os.path.exists(data_path) or not os.path.exists(meta_path):
+            return np.empty(0, dtype=BAR_DTYPE), None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        return np.load(data_path, mmap_mode='r'), meta
+
+    def _write(self, symbol: str, interval: str, bars, meta: dict):
+        os.makedirs(self.root, exist_ok=True)
+        data_path, meta_path = self._paths(symbol, interval)
+        # write-then-rename so readers holding the old memory map are unaffected
+        with open(data_path + '.tmp', 'wb') as f:
+            np.save(f, np.ascontiguousarray(bars))
+        os.replace(data_path + '.tmp', data_path)
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def bars(self, symbol: str, period: str, interval: str, fetch) -> tuple:
+        """Return (bars, tz) for `period`, fetching only what the store lacks.
+
+        `fetch(**kwargs)` must return a yfinance-style history DataFrame and is
+        called with either `period=` (store does not reach back far enough) or
+        `start=` (refresh the tail from the last stored bar). Only the lock of
+        this symbol/interval is held while it runs.
+        """
+        sessions = _SESSIONS.get(period)
+        start = period_start(period)
+        with self._key_lock(symbol, interval):
+            bars, meta = self._read(symbol, interval)
+            now = time.time()
+            if meta is None or not len(bars):
+                covered = False
+            elif sessions:
+                # enough session dates stored since coverage began; a stale tail is refreshed below
+                stored = bars[np.searchsorted(bars['ts'], meta['covered_from']):]
+                covered = len(np.unique(_utc(stored['ts']).tz_convert(meta['tz']).normalize().asi8)) >= sessions
+            else:
+                covered = start >= meta['covered_from']
+            if not covered:
+                df = fetch(period=period)
+                covered_from = start
+            elif now - meta['fetched_at'] >= REFRESH.get(interval, DEFAULT_REFRESH):
+                # refetch from the last stored bar, which may have been incomplete
+                df = fetch(start=_utc(int(bars['ts'][-1])))
+                covered_from = meta['covered_from']
+            else:
+                df = None
+            if df is not None:
+                tz = meta['tz'] if meta else 'UTC'
+                new = None
+                if not df.empty:
+                    new, tz = frame_to_bars(df)
+                if not covered and sessions:
+                    # upstream decides where the sessions begin; older bars only count if they join up
+                    first = int(new['ts'][0]) if new is not None else int(now * 1e9)
+                    joined = meta is not None and len(bars) and bars['ts'][-1] >= first
+                    covered_from = min(meta['covered_from'], first) if joined else first
+                elif not covered and new is not None:
+                    # return everything upstream sent, even if it starts before our calendar estimate
+                    start = min(start, int(new['ts'][0]))
+                if new is not None:
+                    bars = merge_bars(np.asarray(bars), new)
+                meta = {'tz': tz, 'covered_from': covered_from, 'fetched_at': now}
+                self._write(symbol, interval, bars, meta)
+        if sessions:
+            lo = session_start(bars, sessions, meta['tz'])
+        else:
+            lo = np.searchsorted(bars['ts'], start)
+        return bars[lo:], meta['tz']
+
+    def compact(self, retention: dict = None) -> int:
+        """Drop bars older than the retention window of their interval; return rows removed."""
+        retention = RETENTION if retention is None else retention
+        removed = 0
+        if not os.path.isdir(self.root):
+            return 0
+        for fname in os.listdir(self.root):
+            if not fname.endswith('.npy'):
+                continue
+            symbol, interval = fname[:-4].rsplit('_', 1)
+            keep_for = retention.get(interval)
+            if keep_for is None:
+                continue
+            with self._key_lock(symbol, interval):
+                bars, meta = self._read(symbol, interval)
+                if meta is None:
+                    continue
+                cutoff = int((time.time() - keep_for) * 1e9)
+                lo = np.searchsorted(bars['ts'], cutoff)
+                if lo:
+                    meta['covered_from'] = max(meta['covered_from'], cutoff)
+                    self._write(symbol, interval, np.array(bars[lo:]), meta)
+                    removed += int(lo)
+        return removed
+
+    def evict(self, symbol: str = None, interval: str = None) -> int:
+        """Delete stored files matching `symbol` and/or `interval`; return files removed."""
+        removed = 0
+        if not os.path.isdir(self.root):
+            return 0
+        prefix = re.sub(r'[^A-Za-z0-9._-]', '_', symbol.upper()) + '_' if symbol else ''
+        for fname in os.listdir(self.root):
+            stem, ext = os.path.splitext(fname)
+            if ext not in ('.npy', '.json') or not stem.startswith(prefix):
+                continue
+            if interval and not stem.endswith('_' + interval):
+                continue
+            with self._key_lock(*stem.rsplit('_', 1)):
+                try:
+                    os.remove(os.path.join(self.root, fname))
+                except FileNotFoundError:
+                    continue
+            removed += 1
+        return removed
+
+
+default_store = MarketStore()
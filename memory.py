@@ -0,0 +1,100 @@
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, SystemMessage, ToolMessage
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+from compaction import estimate_tokens
+
+''' Bounded conversation history
+
+Installed as the agent's pre_model_hook, so it runs on the checkpointed
+session state before every model call. When the history is over budget,
+tool outputs from earlier turns are replaced by a stub first; turns beyond
+the last KEEP_TURNS (or still over budget) are then folded into a running
+summary message at the top of the history. The summary is built
+incrementally from the previous summary plus the turns being folded in, so
+prompt size stays roughly constant however long the session runs.
+'''
+
+KEEP_TURNS = 4
+HISTORY_BUDGET = 3000        # tokens of history sent to the model
+SUMMARY_BUDGET = 500         # tokens kept in the running summary
+SUMMARY_ID = "history-summary"
+TOOL_STUB = "[earlier tool output dropped to save context]"
+
+
+def _text(msg) -> str:
+    content = msg.content
+    if isinstance(content, str):
+        return content
+    return " ".join(b.get("text", "") for b in content if isinstance(b, dict))
+
+
+def _tokens(messages) -> int:
+    return sum(estimate_tokens(_text(m)) for m in messages)
+
+
+def _split_turns(messages) -> list:
+    """Group messages into turns, each starting at a HumanMessage."""
+    turns = []
+    for msg in messages:
+        if isinstance(msg, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(msg)
+    return turns
+
+
+def extractive_summary(previous: str, turns) -> str:
+    """Summarise turns as one line per exchange without a model call."""
+    lines = previous.splitlines() if previous else []
+    for turn in turns:
+        question = next((_text(m) for m in turn if isinstance(m, HumanMessage)), "")
+        answers = [_text(m) for m in turn if isinstance(m, AIMessage) and _text(m).strip()]
+        tools_used = sorted({c["name"] for m in turn if isinstance(m, AIMessage) for c in m.tool_calls})
+        line = f"- User: {' '.join(question.split())[:200]}"
+        if tools_used:
+            line += f" | tools: {', '.join(tools_used)}"
+        if answers:
+            line += f" | Assistant: {' '.join(answers[-1].split())[:300]}"
+        lines.append(line)
+    # keep the newest lines that fit
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > SUMMARY_BUDGET:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def make_history_hook(summarize=extractive_summary):
+    """Return a pre_model_hook enforcing KEEP_TURNS / HISTORY_BUDGET.
+
+    `summarize(previous_summary, turns) -> str` folds old turns into the
+    summary; the default is extractive and costs no extra model call.
+    """
+    def trim_history(state):
+        messages = state["messages"]
+        summary = None
+        if messages and messages[0].id == SUMMARY_ID:
+            summary, messages = messages[0], messages[1:]
+        turns = _split_turns(messages)
+        budget = HISTORY_BUDGET - (_tokens([summary]) if summary else 0)
+        changed = False
+
+        # 1. stale tool outputs go first
+        if _tokens(messages) > budget:
+            for turn in turns[:-1]:
+                for i, msg in enumerate(turn):
+                    if isinstance(msg, ToolMessage) and msg.content != TOOL_STUB:
+                        turn[i] = msg.model_copy(update={"content": TOOL_STUB})
+                        changed = True
+
+        # 2. fold the oldest turns into the summary, always keeping the current one
+        old = []
+        while len(turns) > 1 and (len(turns) > KEEP_TURNS or _tokens([m for t in turns for m in t]) > budget):
+            old.append(turns.pop(0))
+        if old:
+            text = summarize(_text(summary).split("\n", 1)[1] if summary else "", old)
+            summary = SystemMessage(content="Summary of earlier conversation:\n" + text, id=SUMMARY_ID)
+            changed = True
+
+        if not changed:
+            return {}
+        kept = [m for t in turns for m in t]
+        return {"messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES)] + ([summary] if summary else []) + kept}
+
+    return trim_history
@@ -0,0 +1,110 @@
+import numpy as np
+
+''' Vectorised Black-Scholes analytics
+
+Every function takes NumPy arrays (or scalars that broadcast) so a whole
+option chain, across expiries, is priced in a handful of array operations.
+No dividends are modelled; rates and times are annualised.
+'''
+
+RISK_FREE_RATE = 0.04
+MIN_VOL, MAX_VOL = 1e-4, 5.0
+
+
+def norm_pdf(x):
+    return np.exp(-0.5 * x * x) / np.sqrt(2 * np.pi)
+
+
+def norm_cdf(x):
+    # Abramowitz & Stegun 7.1.26 (|error| < 1.5e-7); avoids a scipy dependency
+    z = np.abs(x) / np.sqrt(2)
+    t = 1.0 / (1.0 + 0.3275911 * z)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - poly * np.exp(-z * z)
+    return 0.5 * (1.0 + np.sign(x) * erf)
+
+
+def _d1_d2(S, K, T, r, sigma):
+    sqrt_t = np.sqrt(T)
+    d1 = (np.log(S / K) + (r + 0.5 * sigma * sigma) * T) / (sigma * sqrt_t)
+    return d1, d1 - sigma * sqrt_t
+
+
+def bs_price(S, K, T, r, sigma, is_call):
+    """Black-Scholes price of calls (`is_call` True) and puts."""
+    d1, d2 = _d1_d2(S, K, T, r, sigma)
+    disc = K * np.exp(-r * T)
+    call = S * norm_cdf(d1) - disc * norm_cdf(d2)
+    put = disc * norm_cdf(-d2) - S * norm_cdf(-d1)
+    return np.where(is_call, call, put)
+
+
+def implied_vol(price, S, K, T, r, is_call, tol: float = 1e-6, max_iter: int = 60):
+    """Solve implied volatility for every contract at once.
+
+    Safeguarded Newton: each contract keeps a [lo, hi] bracket and takes a
+    bisection step whenever the Newton step leaves it or vega vanishes.
+    Prices outside the no-arbitrage bounds yield NaN.
+    """
+    price, S, K, T, is_call = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (price, S, K, T, is_call)))
+    is_call = is_call.astype(bool)
+    disc = K * np.exp(-r * T)
+    lower = np.where(is_call, np.maximum(S - disc, 0.0), np.maximum(disc - S, 0.0))
+    upper = np.where(is_call, S, disc)
+    valid = np.isfinite(price) & (price > lower) & (price < upper) & (T > 0)
+
+    lo = np.full(price.shape, MIN_VOL)
+    hi = np.full(price.shape, MAX_VOL)
+    sigma = np.full(price.shape, 0.3)
+    active = valid.copy()
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        diff = bs_price(S, K, T, r, sigma, is_call) - price
+        active &= np.abs(diff) > tol
+        # price is increasing in sigma, so the sign of diff narrows the bracket
+        hi = np.where(active & (diff > 0), sigma, hi)
+        lo = np.where(active & (diff < 0), sigma, lo)
+        v = vega(S, K, T, r, sigma)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = sigma - diff / v
+        newton_ok = (v > 1e-10) & (step > lo) & (step < hi)
+        sigma = np.where(active, np.where(newton_ok, step, 0.5 * (lo + hi)), sigma)
+    return np.where(valid, sigma, np.nan)
+
+
+def delta(S, K, T, r, sigma, is_call):
+    d1, _ = _d1_d2(S, K, T, r, sigma)
+    return np.where(is_call, norm_cdf(d1), norm_cdf(d1) - 1.0)
+
+
+def gamma(S, K, T, r, sigma):
+    d1, _ = _d1_d2(S, K, T, r, sigma)
+    return norm_pdf(d1) / (S * sigma * np.sqrt(T))
+
+
+def vega(S, K, T, r, sigma):
+    """Price change per 1.00 change in volatility."""
+    d1, _ = _d1_d2(S, K, T, r, sigma)
+    return S * norm_pdf(d1) * np.sqrt(T)
+
+
+def theta(S, K, T, r, sigma, is_call):
+    """Price change per year of elapsed time (divide by 365 for per-day)."""
+    d1, d2 = _d1_d2(S, K, T, r, sigma)
+    decay = -S * norm_pdf(d1) * sigma / (2 * np.sqrt(T))
+    carry = r * K * np.exp(-r * T)
+    return np.where(is_call, decay - carry * norm_cdf(d2), decay + carry * norm_cdf(-d2))
+
+
+def greeks(price, S, K, T, is_call, r: float = RISK_FREE_RATE) -> dict:
+    """Return implied vol and delta/gamma/theta(per day)/vega(per vol point) arrays."""
+    iv = implied_vol(price, S, K, T, r, is_call)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'iv': iv,
+            'delta': delta(S, K, T, r, iv, is_call),
+            'gamma': gamma(S, K, T, r, iv),
+            'theta': theta(S, K, T, r, iv, is_call) / 365.0,
+            'vega': vega(S, K, T, r, iv) / 100.0,
+        }
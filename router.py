@@ -0,0 +1,139 @@
+import re, threading, tracing
+from tools import _cacheable, get_stock_quote, get_weather, read_gmail
+
+''' Fast-path intent router
+
+Short commands that map onto a single tool call ("quote AAPL", "weather in
+Paris", "check unread mail") are answered without the model: the input is
+matched against each route's patterns, the tool is called directly and the
+reply is filled in from the route's template. Inputs that match no route,
+match more than one, or make the tool raise or report a failure go to the
+LLM as before.
+
+Patterns are anchored to the whole (normalised) input, so anything with
+extra conditions ("quote AAPL and compare it with MSFT") is left to the
+model.
+'''
+
+_POLITE = re.compile(r"^(?:(?:hey|hi|ok|okay|please|can you|could you|would you)[,\s]+)+|[\s,]*(?:please|thanks|thank you)$", re.IGNORECASE)
+_SYMBOL = r"(?P<symbol>[A-Z]{1,5}(?:[.\-][A-Z]{1,2})?)"
+_TICKER = rf"\$?{_SYMBOL}"
+# a place name of at most three words, none of them a connective or time word
+# ("paris and london", "the week in rome" and "paris now" are not cities)
+_NOT_CITY = r"(?:and|or|vs|versus|compare|compared|with|than|the|in|for|at|on|this|next|week|weekend|tomorrow|tonight|today|now|right|forecast)\b"
+_CITY = rf"(?P<city>(?!{_NOT_CITY})[a-z][a-z.'\-]*(?: (?!{_NOT_CITY})[a-z][a-z.'\-]*){{0,2}})"
+
+
+def _normalise(text: str) -> str:
+    text = " ".join(text.split()).strip(" .!?")
+    # "$msft" is explicit enough to take as a ticker in any case
+    text = re.sub(r"\$([A-Za-z.\-]+)", lambda m: "$" + m[1].upper(), text)
+    return _POLITE.sub("", text).strip(" .!?")
+
+
+class Route:
+    """One intent: patterns to match, the tool to call and how to phrase the reply.
+
+    `args(match) -> dict` builds the tool's keyword arguments from the regex
+    match; `template` is formatted with the tool result as `{result}` plus
+    those arguments. `ok(result) -> bool` tells a usable result from the
+    error strings the tools return instead of raising.
+    """
+
+    def __init__(self, name: str, tool, patterns, args, template: str = "{result}", flags: int = re.IGNORECASE,
+                 ok=_cacheable):
+        self.name = name
+        self.tool = tool
+        self.patterns = [re.compile(rf"^(?:{p})$", flags) for p in patterns]
+        self.args = args
+        self.template = template
+        self.ok = ok
+
+    def match(self, text: str):
+        for pattern in self.patterns:
+            m = pattern.match(text)
+            if m:
+                return m
+        return None
+
+
+class Router:
+    def __init__(self, routes):
+        self.routes = list(routes)
+        self._lock = threading.Lock()
+        self.stats = {"routed": 0, "fallback": 0, "ambiguous": 0, "errors": 0}
+        self.route_counts = {r.name: 0 for r in self.routes}
+
+    def _count(self, key: str, route: str = None):
+        with self._lock:
+            self.stats[key] += 1
+            if route:
+                self.route_counts[route] += 1
+
+    def route(self, text: str):
+        """Return a reply for `text` if a single route handles it, else None (use the LLM)."""
+        handled = self.handle(text)
+        return handled[1] if handled else None
+
+    def handle(self, text: str):
+        """Like route() but return (tool name, reply) so callers can count the tool call."""
+        text = _normalise(text)
+        hits = [(r, m) for r in self.routes for m in [r.match(text)] if m]
+        if len(hits) != 1:
+            self._count("ambiguous" if hits else "fallback")
+            return None
+        route, m = hits[0]
+        args = route.args(m)
+        try:
+            with tracing.span(f"tool:{route.tool.__name__}", args=args, fast_path=True):
+                result = route.tool(**args)
+        except Exception:
+            self._count("errors")
+            return None
+        if not route.ok(result):
+            # the tools report failures as text; let the model explain or retry
+            self._count("errors")
+            return None
+        self._count("routed", route.name)
+        return route.tool.__name__, route.template.format(result=result, **args)
+
+    def summary(self) -> str:
+        with self._lock:
+            total = sum(self.stats.values())
+            share = f"{100 * self.stats['routed'] / total:.0f}%" if total else "n/a"
+            per_route = ", ".join(f"{k} {v}" for k, v in self.route_counts.items() if v)
+            return (f"router: {self.stats['routed']}/{total} turns on the fast path ({share}), "
+                    f"{self.stats['ambiguous']} ambiguous, {self.stats['errors']} tool errors"
+                    + (f" [{per_route}]" if per_route else ""))
+
+
+def _mail_ok(result) -> bool:
+    return result == "No messages found." or _cacheable(result)
+
+
+def default_routes() -> list:
+    return [
+        Route("quote", get_stock_quote, [
+            # tickers must be typed in capitals (or with a $) so words are not mistaken for symbols
+            rf"(?i:quote|price(?: of)?|(?:what(?:'s| is) )?(?:the )?(?:stock )?price (?:of|for)) {_TICKER}",
+            # "how is AI doing" is not a quote request: a bare word needs "stock"/"shares"
+            rf"(?i:how(?:'s| is)) \${_SYMBOL}(?i: (?:doing|trading)(?: today)?)?",
+            rf"(?i:how(?:'s| is)) {_TICKER}(?i: (?:stock|shares)(?: (?:doing|trading))?(?: today)?)",
+            rf"{_TICKER}(?i: (?:quote|price))",
+        ], lambda m: {"symbol": m["symbol"]}, flags=0),
+        Route("weather", get_weather, [
+            rf"(?:what(?:'s| is) the )?weather (?:in|for|at) {_CITY}(?: today| now| right now)?",
+            rf"how(?:'s| is) the weather in {_CITY}(?: today| now| right now)?",
+        ], lambda m: {"city": m["city"].strip().title()}),
+        Route("unread_mail", read_gmail, [
+            r"(?:check|read|show)(?: me)?(?: my)? (?:unread|new) (?:e-?mails?|mail|messages)",
+            r"(?:do i have |are there )?any (?:unread|new) (?:e-?mails?|mail|messages)",
+        ], lambda m: {"criteria": "UNSEEN", "limit": 10}, "Unread mail:\n{result}", ok=_mail_ok),
+        Route("inbox", read_gmail, [
+            r"(?:check|read|show)(?: me)?(?: my)? (?:e-?mails?|mail|inbox)",
+        ], lambda m: {"criteria": "ALL", "limit": 10}, "Latest mail:\n{result}", ok=_mail_ok),
+    ]
+
+
+def default_router() -> Router:
+    return Router(default_routes())
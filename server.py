@@ -0,0 +1,240 @@
+import asyncio, json, time, uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+import compaction, tool_runner, tracing
+from cache import default_cache
+
+''' Multi-session server
+
+One process hosts many conversations behind a WebSocket endpoint:
+
+    ws://HOST:PORT/ws[?session=ID]
+
+Each connection belongs to a session whose history lives in the agent's
+checkpointer under its own thread id; reconnecting with the same id resumes
+it, and sessions idle for SESSION_TTL are forgotten. The client sends one
+prompt per text frame (plain text or {"message": ...}) and receives JSON
+events:
+
+    {"type": "session", "id"}                   once, after connecting
+    {"type": "token", "text"}                   reply text as it streams
+    {"type": "tool", "name", "status": "call"|"done"}
+    {"type": "done", "reply", "latency", "tools", "fast_path"}
+    {"type": "error", "error"}
+
+Turns run on a pool of MAX_TURNS threads (the graph and the tools are
+synchronous), so at most that many model calls are in flight; tool calls
+are further bounded by tool_runner's pool. Turns of one session run one at
+a time, in order. GET /health and GET /metrics answer plain HTTP.
+
+The server takes any Agent: tests/test_server.py starts it on port 0 with
+bench_fakes' scripted chat model in constants.gpt_model and reads the bound
+port from `ready`.
+'''
+
+MAX_TURNS = 8           # concurrent turns (model calls) per process
+SESSION_TTL = 1800      # seconds an idle, disconnected session is kept
+LATENCY_WINDOW = 1000   # recent turns used for the latency percentiles
+
+
+def _percentiles(values) -> dict:
+    values = sorted(values)
+    if not values:
+        return {}
+    return {f"p{p}": round(values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))], 3)
+            for p in (50, 95, 99)}
+
+
+class Session:
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.lock = asyncio.Lock()
+        self.connections = 0
+        self.last_seen = time.monotonic()
+
+
+class AgentServer:
+    def __init__(self, agent, max_turns: int = MAX_TURNS, session_ttl: float = SESSION_TTL):
+        self.agent = agent
+        self.session_ttl = session_ttl
+        self.sessions = {}
+        self._turns = asyncio.Semaphore(max_turns)
+        self._executor = ThreadPoolExecutor(max_workers=max_turns, thread_name_prefix="turn")
+        self.started = time.monotonic()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.first_tokens = deque(maxlen=LATENCY_WINDOW)
+        self.stats = {"connections": 0, "turns": 0, "active": 0, "waiting": 0, "errors": 0, "fast_path": 0}
+
+    # -- sessions --------------------------------------------------------
+
+    def _session(self, session_id: str = None) -> Session:
+        session_id = session_id or uuid.uuid4().hex
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self.sessions[session_id] = Session(session_id)
+        return session
+
+    async def _expire_sessions(self):
+        while True:
+            await asyncio.sleep(min(60, self.session_ttl))
+            now = time.monotonic()
+            for session in list(self.sessions.values()):
+                if session.connections == 0 and not session.lock.locked() and now - session.last_seen > self.session_ttl:
+                    del self.sessions[session.id]
+                    self.agent.agent.checkpointer.delete_thread(session.id)
+
+    # -- turns -----------------------------------------------------------
+
+    def _produce(self, loop, events: asyncio.Queue, text: str, session_id: str):
+        """Run one turn on a worker thread, forwarding its events to the event loop."""
+        put = lambda event: loop.call_soon_threadsafe(events.put_nowait, event)
+        try:
+            with tracing.span("turn", session=session_id, chars=len(text)):
+                handled = self.agent._fast_path(text, session_id)
+                if handled is not None:
+                    put(("fast_path", handled))
+                else:
+                    for event in self.agent.stream_events(text, session_id):
+                        put(event)
+            put(("end", None))
+        except Exception as e:
+            put(("error", f"{type(e).__name__}: {e}"))
+
+    async def _run_turn(self, ws, session: Session, text: str):
+        async with session.lock:
+            self.stats["waiting"] += 1
+            async with self._turns:
+                self.stats["waiting"] -= 1
+                self.stats["active"] += 1
+                try:
+                    await self._stream_turn(ws, session, text)
+                finally:
+                    self.stats["active"] -= 1
+                    session.last_seen = time.monotonic()
+
+    async def _stream_turn(self, ws, session: Session, text: str):
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        t0 = time.monotonic()
+        worker = loop.run_in_executor(self._executor, self._produce, loop, events, text, session.id)
+        reply, tools_used, fast_path, first_token = [], {}, False, None
+        sending = True
+        while True:
+            kind, value = await events.get()
+            message = None
+            if kind == "token":
+                if first_token is None:
+                    first_token = time.monotonic() - t0
+                reply.append(value)
+                message = {"type": "token", "text": value}
+            elif kind == "tool_call":
+                message = {"type": "tool", "name": value, "status": "call"}
+            elif kind == "tool_result":
+                tools_used[value] = tools_used.get(value, 0) + 1
+                message = {"type": "tool", "name": value, "status": "done"}
+            elif kind == "fast_path":
+                fast_path = True
+                tools_used[value[0]] = 1
+                reply.append(value[1])
+                first_token = time.monotonic() - t0
+                message = {"type": "token", "text": value[1]}
+            elif kind == "error":
+                self.stats["errors"] += 1
+                message = {"type": "error", "error": value}
+            if message is not None and sending:
+                try:
+                    await ws.send(json.dumps(message, ensure_ascii=False))
+                except ConnectionClosed:
+                    # the turn still finishes so the session history stays consistent
+                    sending = False
+            if kind in ("end", "error"):
+                break
+        await worker
+        latency = time.monotonic() - t0
+        self.stats["turns"] += 1
+        self.stats["fast_path"] += fast_path
+        if kind == "end":
+            self.latencies.append(latency)
+            if first_token is not None:
+                self.first_tokens.append(first_token)
+            if sending:
+                await ws.send(json.dumps({"type": "done", "reply": "".join(reply), "latency": round(latency, 3),
+                                          "tools": tools_used, "fast_path": fast_path}, ensure_ascii=False))
+
+    # -- endpoints -------------------------------------------------------
+
+    async def handler(self, ws):
+        url = urlsplit(ws.request.path)
+        session = self._session(parse_qs(url.query).get("session", [None])[0])
+        session.connections += 1
+        self.stats["connections"] += 1
+        try:
+            await ws.send(json.dumps({"type": "session", "id": session.id}))
+            async for frame in ws:
+                if isinstance(frame, bytes):
+                    frame = frame.decode(errors="replace")
+                text = frame
+                if frame.lstrip().startswith("{"):
+                    try:
+                        text = json.loads(frame).get("message", "")
+                    except (json.JSONDecodeError, AttributeError):
+                        pass
+                if not isinstance(text, str) or not text.strip():
+                    await ws.send(json.dumps({"type": "error", "error": "empty message"}))
+                    continue
+                await self._run_turn(ws, session, text)
+        except ConnectionClosed:
+            pass
+        finally:
+            session.connections -= 1
+            session.last_seen = time.monotonic()
+
+    def metrics(self) -> dict:
+        router = self.agent.router
+        return {
+            "uptime": round(time.monotonic() - self.started, 1),
+            "sessions": len(self.sessions),
+            "open_sessions": sum(1 for s in self.sessions.values() if s.connections),
+            **self.stats,
+            "latency": _percentiles(self.latencies),
+            "first_token": _percentiles(self.first_tokens),
+            "tool_calls": dict(tool_runner.stats),
+            "compaction": dict(compaction.stats),
+            "router": dict(router.stats) if router is not None else None,
+            "cache": default_cache.stats(),
+            "trace": tracing.histograms() if tracing.enabled else None,
+        }
+
+    def process_request(self, connection, request):
+        path = urlsplit(request.path).path
+        if path == "/ws":
+            return None
+        if path == "/health":
+            body = {"status": "ok"}
+        elif path == "/metrics":
+            body = self.metrics()
+        else:
+            return connection.respond(HTTPStatus.NOT_FOUND, "not found\n")
+        response = connection.respond(HTTPStatus.OK, json.dumps(body) + "\n")
+        del response.headers["Content-Type"]
+        response.headers["Content-Type"] = "application/json"
+        return response
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765, ready=None):
+        """Serve until cancelled; `ready(port)` is called once the socket is bound."""
+        expiry = asyncio.create_task(self._expire_sessions())
+        try:
+            async with serve(self.handler, host, port, process_request=self.process_request) as server:
+                bound = server.sockets[0].getsockname()[1]
+                if ready is not None:
+                    ready(bound)
+                else:
+                    print(f"Serving on ws://{host}:{bound}/ws (health: http://{host}:{bound}/health)")
+                await server.serve_forever()
+        finally:
+            expiry.cancel()
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,162 @@
+import os, signal, itertools, threading, subprocess, time
+
+''' Shell commands with bounded output
+
+Output is read from the pipes as it is produced into a head + tail buffer,
+so a chatty command costs at most HEAD_BYTES + TAIL_BYTES of memory (and of
+model context) per stream while the total byte count is still reported.
+Commands can also run as background jobs that are polled later by id.
+'''
+
+HEAD_BYTES = 4000
+TAIL_BYTES = 4000
+MAX_JOBS = 20  # finished jobs beyond this are forgotten, oldest first
+DRAIN_SECONDS = 5  # how long output may keep flowing after the process exits
+
+
+class BoundedBuffer:
+    """Keeps the first `head` and last `tail` bytes written, plus a total count."""
+
+    def __init__(self, head: int = HEAD_BYTES, tail: int = TAIL_BYTES):
+        self.head_limit = head
+        self.tail_limit = tail
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def write(self, data: bytes):
+        with self._lock:
+            self.total += len(data)
+            room = self.head_limit - len(self.head)
+            if room > 0:
+                self.head += data[:room]
+                data = data[room:]
+            if data:
+                self.tail += data
+                if len(self.tail) > self.tail_limit:
+                    del self.tail[:len(self.tail) - self.tail_limit]
+
+    def text(self) -> str:
+        with self._lock:
+            omitted = self.total - len(self.head) - len(self.tail)
+            marker = f"\n… [{omitted} bytes omitted] …\n" if omitted > 0 else ""
+            return (self.head.decode(errors='replace') + marker + self.tail.decode(errors='replace')).strip()
+
+    def last(self, n: int) -> str:
+        """Return roughly the last `n` bytes written (bounded by what was kept)."""
+        with self._lock:
+            kept = self.head + self.tail if self.total <= self.head_limit + self.tail_limit else self.tail
+            return bytes(kept[-n:]).decode(errors='replace')
+
+
+class Job:
+    def __init__(self, job_id: int, command: str, head: int = HEAD_BYTES, tail: int = TAIL_BYTES):
+        self.id = job_id
+        self.command = command
+        self.started = time.monotonic()
+        self.ended = None
+        self.timed_out = False
+        self.stdout = BoundedBuffer(head, tail)
+        self.stderr = BoundedBuffer(head, tail)
+        # own process group so a timeout or stop kills the whole pipeline
+        self.proc = subprocess.Popen(command, shell=True, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE, start_new_session=True)
+        self._readers = [threading.Thread(target=self._pump, args=(s, b), daemon=True)
+                         for s, b in ((self.proc.stdout, self.stdout), (self.proc.stderr, self.stderr))]
+        for r in self._readers:
+            r.start()
+
+    @staticmethod
+    def _pump(stream, buf):
+        for chunk in iter(lambda: stream.read1(65536), b''):
+            buf.write(chunk)
+        stream.close()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Wait for exit and for the output to drain; return False on timeout.
+
+        The whole call, draining included, returns within `timeout`.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            self.proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            return False
+        if self.ended is None:
+            self.ended = time.monotonic()
+        # a background child can hold the pipes open; drain for a bounded time, shared by both readers
+        drain_until = time.monotonic() + DRAIN_SECONDS
+        if deadline is not None:
+            drain_until = min(drain_until, deadline)
+        for r in self._readers:
+            r.join(max(0.0, drain_until - time.monotonic()))
+        return True
+
+    @property
+    def output_open(self) -> bool:
+        """Whether something the command started still holds its output open."""
+        return any(r.is_alive() for r in self._readers)
+
+    def kill(self):
+        try:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        self.wait()
+
+    @property
+    def running(self) -> bool:
+        return self.proc.poll() is None
+
+    def status_line(self) -> str:
+        elapsed = (self.ended or time.monotonic()) - self.started
+        if self.timed_out:
+            state = f"timed out after {elapsed:.1f}s"
+        elif self.running:
+            state = f"running for {elapsed:.1f}s"
+        else:
+            state = f"exit {self.proc.returncode} after {elapsed:.1f}s"
+            if self.output_open:
+                state += ", output still held open by a background process"
+        return f"[{state}; stdout {self.stdout.total} bytes, stderr {self.stderr.total} bytes]"
+
+    def output(self) -> str:
+        out = self.stdout.text()
+        err = self.stderr.text()
+        return (out + ("\n" + err if err else "")).strip() or "(no output)"
+
+
+def run(command: str, timeout: float = 30, head: int = HEAD_BYTES, tail: int = TAIL_BYTES) -> Job:
+    """Run `command` to completion (or until `timeout`), keeping bounded output."""
+    job = Job(0, command, head, tail)
+    if not job.wait(timeout):
+        job.timed_out = True
+        job.kill()
+    return job
+
+
+_jobs = {}
+_ids = itertools.count(1)
+_lock = threading.Lock()
+
+
+def start(command: str) -> Job:
+    with _lock:
+        job = Job(next(_ids), command)
+        _jobs[job.id] = job
+        threading.Thread(target=job.wait, name=f"job-{job.id}", daemon=True).start()
+        finished = [j for j in _jobs.values() if not j.running]
+        for old in finished[:max(0, len(_jobs) - MAX_JOBS)]:
+            del _jobs[old.id]
+    return job
+
+
+def get(job_id: int):
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def all_jobs() -> list:
+    with _lock:
+        return list(_jobs.values())
@@ -0,0 +1,63 @@
+import importlib, threading, time
+from contextlib import contextmanager
+
+''' Deferred imports and start-up timing
+
+lazy_import() returns a stand-in that imports the real module on first
+attribute access, so heavy dependencies (pandas, yfinance, VOSK, audio
+libraries) are only paid for by the code paths that use them. Every such
+load, and every block wrapped in timed(), is recorded for --profile-startup.
+'''
+
+timings = []  # (component, seconds) in the order they finished
+_lock = threading.Lock()
+_t0 = time.perf_counter()
+
+
+@contextmanager
+def timed(component: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _lock:
+            timings.append((component, time.perf_counter() - start))
+
+
+class _LazyModule:
+    """Placeholder that imports `name` the first time one of its attributes is used."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._load_lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._load_lock:
+                if self._module is None:
+                    with timed(f"import {self._name}"):
+                        self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name: str):
+    return _LazyModule(name)
+
+
+def report() -> str:
+    """Return the recorded timings as a table, slowest first."""
+    with _lock:
+        rows = sorted(timings, key=lambda t: -t[1])
+    width = max([len(name) for name, _ in rows] + [9])
+    lines = [f"{'component':<{width}}  seconds"]
+    lines += [f"{name:<{width}}  {secs:7.3f}" for name, secs in rows]
+    lines.append(f"{'wall time':<{width}}  {time.perf_counter() - _t0:7.3f}")
+    return "\n".join(lines)
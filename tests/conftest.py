@@ -0,0 +1,4 @@
+import os, sys
+
+# the app is a flat set of modules at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,42 @@
+import imaplib
+import pytest
+import bench_fakes, gmail, mail_mirror
+
+
+@pytest.fixture
+def mirror(tmp_path, monkeypatch):
+    server = bench_fakes.IMAPStub(bench_fakes.make_mailbox(30)).start()
+
+    def connect():
+        conn = imaplib.IMAP4("127.0.0.1", server.port)
+        conn.login("me@example.com", "secret")
+        return conn
+
+    monkeypatch.setattr(gmail, "imap_pool", gmail.ConnectionPool(connect, lambda c: c.noop()[0] == 'OK', lambda c: c.logout()))
+    yield mail_mirror.MailMirror(str(tmp_path / "mirror.sqlite"))
+    server.stop()
+
+
+def test_truncated_first_sync_does_not_cover_the_folder(mirror, monkeypatch):
+    monkeypatch.setattr(mail_mirror, "INITIAL_SYNC_LIMIT", 10)
+    assert mirror.sync() == 10
+    assert mirror.is_fresh() and not mirror.covers()
+
+
+def test_full_sync_covers_the_folder(mirror):
+    assert mirror.sync() == 30
+    assert mirror.covers()
+
+
+def test_subject_matches_only_the_subject(mirror):
+    mirror.sync()
+    query = mail_mirror.criteria_to_query('SUBJECT "Message 12"')
+    assert query == {"subject": "Message 12"}
+    assert [m["uid"] for m in mirror.query(**query)] == [12]
+    # the sender is not part of the subject
+    assert mirror.query(**mail_mirror.criteria_to_query('SUBJECT example')) == []
+
+
+@pytest.mark.parametrize("criteria", ['TEXT "invoice"', 'BODY "invoice"', 'UNSEEN'])
+def test_criteria_the_mirror_cannot_answer_go_to_imap(criteria):
+    assert mail_mirror.criteria_to_query(criteria) is None
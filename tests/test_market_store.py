@@ -0,0 +1,72 @@
+import os, threading, time
+import pandas as pd, pytest
+from market_store import MarketStore, bars_to_csv
+
+
+def yahoo_frame(days, tz="America/New_York", close=100.0):
+    """A history frame built the way yfinance builds one (epoch seconds -> [s] index)."""
+    import yfinance.utils
+    opens = [close + i for i in range(len(days))]
+    data = {
+        "timestamp": [int(pd.Timestamp(d, tz=tz).timestamp()) for d in days],
+        "indicators": {"quote": [{"open": opens, "high": opens, "low": opens, "close": opens,
+                                  "volume": [1000] * len(days)}]},
+    }
+    df = yfinance.utils.parse_quotes(data)
+    df.index = df.index.tz_localize("UTC").tz_convert(tz)
+    return df
+
+
+def test_yahoo_frame_round_trips(tmp_path):
+    days = [d.strftime("%Y-%m-%d 09:30") for d in pd.bdate_range(end=pd.Timestamp.now(), periods=40)]
+    df = yahoo_frame(days)
+    assert df.index.dtype.unit != "ns"   # the resolution that used to break the store
+    bars, tz = MarketStore(str(tmp_path)).bars("AAPL", "3mo", "1d", lambda **kw: df)
+    assert len(bars) == len(days) and tz == "America/New_York"
+    rows = bars_to_csv(bars, tz).splitlines()
+    assert rows[1].startswith(days[0]) and rows[-1].startswith(days[-1])
+
+
+def test_session_periods_keep_what_upstream_returned(tmp_path):
+    # five sessions spanning a weekend, long before "now"
+    days = ["2025-10-01", "2025-10-02", "2025-10-03", "2025-10-06", "2025-10-07"]
+    calls = []
+    fetch = lambda **kw: calls.append(kw) or yahoo_frame(days)
+    store = MarketStore(str(tmp_path))
+    assert len(store.bars("MSFT", "5d", "1d", fetch)[0]) == 5
+    assert len(store.bars("MSFT", "5d", "1d", fetch)[0]) == 5
+    last, _ = store.bars("MSFT", "1d", "1d", fetch)
+    assert len(last) == 1 and bars_to_csv(last, "America/New_York").splitlines()[1].startswith("2025-10-07")
+    assert len(calls) == 1
+
+
+def test_fetches_for_different_symbols_run_concurrently(tmp_path):
+    store = MarketStore(str(tmp_path))
+    days = [d.strftime("%Y-%m-%d") for d in pd.bdate_range(end=pd.Timestamp.now(), periods=10)]
+
+    def slow(**kw):
+        time.sleep(0.3)
+        return yahoo_frame(days)
+
+    threads = [threading.Thread(target=store.bars, args=(s, "1mo", "1d", slow)) for s in ("A", "B", "C")]
+    t0 = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert time.monotonic() - t0 < 0.6
+
+
+@pytest.mark.skipif(not os.environ.get("LIVE_TESTS"), reason="calls Yahoo; set LIVE_TESTS=1 to run")
+def test_live_yfinance_history_round_trips(tmp_path):
+    yf = pytest.importorskip("yfinance")
+    try:
+        df = yf.Ticker("AAPL").history(period="5d", interval="1d")
+    except Exception as e:
+        pytest.skip(f"Yahoo unreachable: {e}")
+    if df.empty:
+        pytest.skip("Yahoo returned no data (offline?)")
+    bars, tz = MarketStore(str(tmp_path)).bars("AAPL", "5d", "1d", lambda **kw: df)
+    assert len(bars) == len(df)
+    first = bars_to_csv(bars, tz).splitlines()[1]
+    assert first.startswith(df.index[0].strftime("%Y-%m-%d"))
@@ -0,0 +1,72 @@
+import pytest
+import router
+
+
+@pytest.fixture
+def weather_router():
+    return router.Router([r for r in router.default_routes() if r.name == "weather"])
+
+
+@pytest.mark.parametrize("text, city", [
+    ("weather in New York", "New York"),
+    ("what's the weather in Rio de Janeiro today", "Rio De Janeiro"),
+    ("how's the weather in salt lake city right now", "Salt Lake City"),
+    ("weather in paris now, please", "Paris"),
+])
+def test_weather_for_a_city_takes_the_fast_path(weather_router, text, city):
+    assert weather_router.handle(text) == ("get_weather", f"It's always sunny in {city}!")
+
+
+@pytest.mark.parametrize("text", [
+    "weather in paris and compare it with london",
+    "weather in paris vs london",
+    "weather for the week in Rome",
+    "weather in a town with a very long name that is really a sentence",
+])
+def test_extra_conditions_go_to_the_model(weather_router, text):
+    assert weather_router.handle(text) is None
+    assert weather_router.stats["fallback"] == 1
+
+
+def _with_tool(name, tool):
+    routes = [r for r in router.default_routes() if r.name == name]
+    for r in routes:
+        r.tool = tool
+    return router.Router(routes)
+
+
+def get_stock_quote(symbol):
+    return f"{symbol}: 100.00 USD"
+
+
+@pytest.mark.parametrize("text, symbol", [
+    ("quote AAPL", "AAPL"),
+    ("how is $msft doing today", "MSFT"),
+    ("how's NVDA stock doing", "NVDA"),
+    ("TSLA price", "TSLA"),
+])
+def test_quotes_take_the_fast_path(text, symbol):
+    assert _with_tool("quote", get_stock_quote).handle(text) == ("get_stock_quote", f"{symbol}: 100.00 USD")
+
+
+@pytest.mark.parametrize("text", ["how is AI doing today", "how is US doing", "how's NATO doing"])
+def test_capitalised_words_are_not_tickers(text):
+    r = _with_tool("quote", get_stock_quote)
+    assert r.handle(text) is None
+    assert r.stats["routed"] == 0
+
+
+def read_gmail(criteria, limit):
+    return "Failed to read Gmail: [AUTHENTICATIONFAILED] Invalid credentials"
+
+
+def test_tool_error_strings_go_to_the_model():
+    r = _with_tool("unread_mail", read_gmail)
+    assert r.handle("check my unread mail") is None
+    assert r.stats["errors"] == 1 and r.stats["routed"] == 0
+
+
+def test_an_empty_mailbox_is_an_answer():
+    r = _with_tool("unread_mail", lambda criteria, limit: "No messages found.")
+    r.routes[0].tool.__name__ = "read_gmail"
+    assert r.handle("any new mail") == ("read_gmail", "Unread mail:\nNo messages found.")
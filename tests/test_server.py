@@ -0,0 +1,84 @@
+import asyncio, json, os, threading, urllib.request
+import pytest
+from websockets.sync.client import connect
+import bench_fakes, constants
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """An AgentServer on a free localhost port, backed by the scripted model."""
+    monkeypatch.chdir(ROOT)   # the agent reads prompts.json from the working directory
+    monkeypatch.setattr(constants, "gpt_model", bench_fakes.ScriptedChatModel(
+        rules=[(r"weather in (\w+)", "get_weather", {"city": "{0}"})], answer_words=5))
+    from agent import Agent
+    from server import AgentServer
+    app = AgentServer(Agent(router=None), max_turns=2)
+    loop = asyncio.new_event_loop()
+    bound = threading.Event()
+    port = []
+    task = loop.create_task(app.serve("127.0.0.1", 0, ready=lambda p: (port.append(p), bound.set())))
+
+    def run():
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            loop.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert bound.wait(10)
+    yield app, port[0]
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join(10)
+
+
+def turn(ws, text):
+    ws.send(text)
+    events = []
+    while not events or events[-1]["type"] not in ("done", "error"):
+        events.append(json.loads(ws.recv(timeout=10)))
+    return events
+
+
+def get(port, path):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=10) as resp:
+        return resp.status, json.loads(resp.read())
+
+
+def test_sessions_stream_replies_and_stay_isolated(server):
+    app, port = server
+    with connect(f"ws://127.0.0.1:{port}/ws?session=a") as a, connect(f"ws://127.0.0.1:{port}/ws?session=b") as b:
+        assert json.loads(a.recv(timeout=10)) == {"type": "session", "id": "a"}
+        assert json.loads(b.recv(timeout=10)) == {"type": "session", "id": "b"}
+
+        events = turn(a, "what's the weather in Paris")
+        kinds = [e["type"] for e in events]
+        assert "tool" in kinds and "token" in kinds
+        done = events[-1]
+        assert done["type"] == "done" and done["tools"] == {"get_weather": 1} and done["reply"]
+        assert done["reply"] == "".join(e["text"] for e in events if e["type"] == "token")
+
+        turn(a, json.dumps({"message": "thanks"}))
+        assert turn(b, "hello")[-1]["type"] == "done"
+
+    history = lambda s: app.agent.agent.get_state({"configurable": {"thread_id": s}}).values["messages"]
+    assert len(history("a")) == 6   # two turns, one with a tool call
+    assert len(history("b")) == 2
+    assert "Paris" not in " ".join(str(m.content) for m in history("b"))
+
+
+def test_health_and_metrics(server):
+    app, port = server
+    assert get(port, "/health") == (200, {"status": "ok"})
+    with connect(f"ws://127.0.0.1:{port}/ws") as ws:
+        ws.recv(timeout=10)
+        turn(ws, "hello")
+    status, metrics = get(port, "/metrics")
+    assert status == 200
+    assert metrics["turns"] == 1 and metrics["errors"] == 0 and metrics["sessions"] == 1
+    assert set(metrics["latency"]) == {"p50", "p95", "p99"}
+    assert "_size" in metrics["cache"]
@@ -0,0 +1,53 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+import voice_control
+
+
+def _broken_init():
+    raise RuntimeError("eSpeak not installed")
+
+
+class _FailingEngine:
+    def setProperty(self, *args):
+        pass
+
+    def connect(self, *args):
+        pass
+
+    def say(self, text):
+        pass
+
+    def runAndWait(self):
+        raise RuntimeError("audio device gone")
+
+
+@pytest.fixture
+def speaker(monkeypatch):
+    def use(init):
+        monkeypatch.setattr(voice_control, "pyttsx3", SimpleNamespace(init=init))
+        return voice_control._Speaker()
+    return use
+
+
+def test_engine_init_failure_disables_the_speaker(speaker):
+    s = speaker(_broken_init)
+    s.say("Hello there. How are you?")
+    assert s.wait(timeout=2)
+    assert s.disabled
+    assert not s.audible_at(time.monotonic())
+    # later replies are dropped rather than queued behind a dead worker
+    s.say("Still there?")
+    assert s.wait(timeout=0)
+    assert s._pending == 0
+    assert "disabled" in s.summary()
+
+
+def test_playback_failure_still_reports_idle(speaker):
+    s = speaker(_FailingEngine)
+    s.say("First sentence. Second sentence.")
+    assert s.wait(timeout=2)
+    assert not s.disabled
+    assert s._pending == 0
+    assert not s.audible_at(time.monotonic() + voice_control.ECHO_TAIL)
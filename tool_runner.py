@@ -0,0 +1,114 @@
+import time, threading, contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.prebuilt import ToolNode
+import compaction, tracing
+
+''' Tool execution with deadlines
+
+LangGraph's ToolNode already runs the tool calls of one model step on a
+thread pool. The wrapper installed here bounds each call by its own deadline
+and by the time left in the step's shared budget, so a step takes as long as
+its slowest tool (at most STEP_DEADLINE) and a tool that overruns is reported
+as a partial result instead of holding up the others. A timed-out call keeps
+running in the background; its result is discarded.
+
+Results are then compacted to the tool's token budget, capped by what is
+left of the turn's budget (see compaction.py).
+'''
+
+DEFAULT_DEADLINE = 20.0
+TOOL_DEADLINES = {
+    "run_cmd": 35.0,           # run_cmd clamps its timeout to tools.RUN_CMD_MAX_TIMEOUT (30s)
+    "search_and_scrape": 20.0,
+    "get_options_chain": 25.0,
+    "read_gmail": 30.0,
+    "search_mail": 60.0,       # first sync of a large mailbox
+    "send_gmail": 30.0,
+}
+STEP_DEADLINE = 45.0
+MAX_WORKERS = 16
+
+_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="tool")
+_steps = {}  # step key -> monotonic start time
+_lock = threading.Lock()
+stats = {"calls": 0, "timeouts": 0, "errors": 0}
+
+
+def _step_started(request) -> float:
+    """Return when the model step this call belongs to started running tools."""
+    config = request.runtime.config if request.runtime is not None else {}
+    metadata = config.get("metadata", {})
+    key = (config.get("configurable", {}).get("thread_id"), metadata.get("langgraph_checkpoint_ns"),
+           metadata.get("langgraph_step"))
+    now = time.monotonic()
+    with _lock:
+        # forget steps that can no longer be running
+        for k in [k for k, t in _steps.items() if now - t > STEP_DEADLINE * 2]:
+            del _steps[k]
+        return _steps.setdefault(key, now)
+
+
+def _turn_usage(request):
+    """Return (tool-output tokens used so far this turn, tool calls in this step)."""
+    state = request.state
+    messages = state.get("messages", []) if isinstance(state, dict) else getattr(state, "messages", [])
+    used, calls = 0, 1
+    for msg in reversed(messages):
+        if isinstance(msg, HumanMessage):
+            break
+        if isinstance(msg, ToolMessage) and isinstance(msg.content, str):
+            used += compaction.estimate_tokens(msg.content)
+        elif isinstance(msg, AIMessage) and calls == 1 and msg.tool_calls:
+            calls = len(msg.tool_calls)
+    return used, calls
+
+
+def _compact(request, result):
+    if not isinstance(result, ToolMessage) or not isinstance(result.content, str):
+        return result
+    budget = compaction.budget_for(request.tool_call["name"], *_turn_usage(request))
+    content = compaction.compact_result(request.tool_call["name"], result.content, budget)
+    if content is result.content:
+        return result
+    return result.model_copy(update={"content": content})
+
+
+def call_with_deadline(request, execute):
+    """ToolNode wrap_tool_call hook enforcing per-tool and per-step deadlines and compacting results."""
+    name = request.tool_call["name"]
+    with tracing.span(f"tool:{name}", args=request.tool_call["args"]) as span:
+        result = _call(request, execute, name)
+        if tracing.enabled and isinstance(result, ToolMessage) and isinstance(result.content, str):
+            span.set(bytes=len(result.content.encode()), status=result.status)
+        return result
+
+
+def _call(request, execute, name):
+    step_left = STEP_DEADLINE - (time.monotonic() - _step_started(request))
+    deadline = max(0.0, min(TOOL_DEADLINES.get(name, DEFAULT_DEADLINE), step_left))
+    with _lock:
+        stats["calls"] += 1
+    # copy the context so callbacks/tracing configured for this run still apply
+    future = _pool.submit(contextvars.copy_context().run, execute, request)
+    try:
+        result = future.result(timeout=deadline)
+    except FutureTimeout:
+        with _lock:
+            stats["timeouts"] += 1
+        return ToolMessage(
+            content=f"Tool {name} did not finish within {deadline:.3g}s; no result is available. "
+                    "Answer with the other results or try again with a narrower request.",
+            name=name,
+            tool_call_id=request.tool_call["id"],
+            status="error",
+        )
+    except Exception:
+        with _lock:
+            stats["errors"] += 1
+        raise
+    return _compact(request, result)
+
+
+def make_tool_node(tools) -> ToolNode:
+    return ToolNode(tools, wrap_tool_call=call_with_deadline)
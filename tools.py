@@ -1,8 +1,48 @@
-import os
-import subprocess, urllib.parse, requests
+import re, math, time, codecs, threading, contextvars
+import urllib.parse
+from html.parser import HTMLParser
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import Optional
-from bs4 import BeautifulSoup
-import yfinance as yf, pandas as pd
+from cache import cached
+import shell_jobs, tracing
+from startup import lazy_import
+
+# Heavy dependencies are imported on first use so start-up stays fast.
+requests = lazy_import("requests")
+bs4 = lazy_import("bs4")
+yf = lazy_import("yfinance")
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+market_store = lazy_import("market_store")
+options_math = lazy_import("options_math")
+gmail = lazy_import("gmail")
+mail_mirror = lazy_import("mail_mirror")
+
+
+# Per-tool cache lifetimes in seconds (see cache.py). Error strings are never cached,
+# nor search results with a page that failed to load.
+QUOTE_TTL = 15
+INTRADAY_TTL = 60
+DAILY_TTL = 6 * 3600
+OPTIONS_TTL = 300
+SEARCH_TTL = 600
+_INTRADAY = ('1m', '2m', '5m', '15m', '30m', '60m', '90m', '1h')
+
+RUN_CMD_MAX_TIMEOUT = 30   # seconds; keeps run_cmd inside its tool_runner deadline
+
+
+def _cacheable(result) -> bool:
+    return isinstance(result, str) and not result.startswith(("Failed", "Search request failed", "No ", "The ", "Missing ", "IMAP "))
+
+
+def _search_cacheable(result) -> bool:
+    # a page that failed or missed the deadline may well load next time
+    return _cacheable(result) and "\nError fetching page: " not in result
+
+
+def _history_ttl(args: dict) -> float:
+    return INTRADAY_TTL if args.get('interval') in _INTRADAY else DAILY_TTL
+
 
 def get_weather(city: str) -> str:
     """Get weather for a given city."""
@@ -12,28 +52,265 @@ def get_weather(city: str) -> str:
 def run_cmd(command: str, timeout: int = 30) -> str:
     """Run a shell command and return its stdout/stderr.
 
+    Output is read as it is produced and only the first and last few
+    thousand bytes of each stream are kept; the reply ends with the exit
+    status and total byte counts. `timeout` is capped at 30 seconds; for
+    long-running commands use start_job.
+
     WARNING: All previous safety checks (environment guard and blacklist)
     have been removed. This will execute the provided command directly in
     the system shell. Use with extreme caution.
     """
     try:
         # Execute via the system shell so the agent can run arbitrary commands.
-        completed = subprocess.run(command, shell=True, capture_output=True, text=True, timeout=timeout)
-        out = completed.stdout.strip()
-        err = completed.stderr.strip()
-        return (out + ("\n" + err if err else "")).strip() or "(no output)"
-    except subprocess.TimeoutExpired:
-        return "Command timed out"
+        # the timeout comes from the model: clamp it so a call never outlives its deadline
+        timeout = min(max(float(timeout), 1.0), RUN_CMD_MAX_TIMEOUT)
+        job = shell_jobs.run(command, timeout=timeout)
+        if job.timed_out:
+            return f"Command timed out\n{job.output()}\n{job.status_line()}"
+        return f"{job.output()}\n{job.status_line()}"
     except Exception as e:
         return f"Failed to execute command: {e}"
 
 
-def search_and_scrape(query: str, top_n: int = 3, snippet_len: int = 500, timeout: int = 10) -> str:
+def start_job(command: str) -> str:
+    """Start a shell command in the background and return its job id.
+
+    Use check_job to poll its status and output tail, and stop_job to kill it.
+    Same lack of safety checks as run_cmd.
+    """
+    try:
+        job = shell_jobs.start(command)
+        return f"Started job {job.id}: {command}"
+    except Exception as e:
+        return f"Failed to start job: {e}"
+
+
+def check_job(job_id: int, tail_bytes: int = 2000) -> str:
+    """Return the status and the last `tail_bytes` of output of a background job."""
+    job = shell_jobs.get(job_id)
+    if job is None:
+        running = ", ".join(f"{j.id} ({j.command[:40]})" for j in shell_jobs.all_jobs()) or "none"
+        return f"No job {job_id}. Known jobs: {running}"
+    out = job.stdout.last(tail_bytes).strip()
+    err = job.stderr.last(tail_bytes).strip()
+    output = (out + ("\n" + err if err else "")).strip() or "(no output yet)"
+    return f"Job {job.id}: {job.command}\n{job.status_line()}\n{output}"
+
+
+def stop_job(job_id: int) -> str:
+    """Kill a background job started with start_job."""
+    job = shell_jobs.get(job_id)
+    if job is None:
+        return f"No job {job_id}"
+    if job.running:
+        job.kill()
+    return f"Job {job.id} stopped {job.status_line()}"
+
+
+HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; AutomationAgent/1.0)"}
+# upstream endpoints (the benchmark points these at local fixtures)
+SEARCH_URL = "https://html.duckduckgo.com/html/"
+STOOQ_URL = "https://stooq.com/q/l/"
+
+# Page fetching: one keep-alive session shared by a bounded worker pool, with
+# at most PER_HOST_LIMIT requests in flight against any single host.
+FETCH_WORKERS = 8
+PER_HOST_LIMIT = 2
+
+_session = None
+_fetch_pool = None
+_host_slots = {}
+_fetch_lock = threading.Lock()
+
+
+def _trace_response(response, *args, **kwargs):
+    # time to response headers; body bytes are added where the body is read
+    span = tracing.current()
+    span.add("http_calls", 1)
+    span.add("http_ms", round(response.elapsed.total_seconds() * 1000, 3))
+
+
+def _http_session():
+    """Return the shared requests.Session, creating it on first use."""
+    global _session
+    with _fetch_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=FETCH_WORKERS * 2, pool_maxsize=PER_HOST_LIMIT * 2)
+            s.mount("http://", adapter)
+            s.mount("https://", adapter)
+            s.headers.update(HEADERS)
+            s.hooks["response"].append(_trace_response)
+            _session = s
+        return _session
+
+
+def _fetch_executor():
+    """Return the shared page-fetch thread pool, creating it on first use."""
+    global _fetch_pool
+    with _fetch_lock:
+        if _fetch_pool is None:
+            _fetch_pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="fetch")
+        return _fetch_pool
+
+
+def _host_slot(url: str):
+    """Return the semaphore limiting concurrent requests to `url`'s host."""
+    host = urllib.parse.urlparse(url).netloc.lower()
+    with _fetch_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = _host_slots[host] = threading.BoundedSemaphore(PER_HOST_LIMIT)
+        return slot
+
+
+# Page extraction: pages are streamed through an incremental tokenizer that
+# keeps only block-level text, and reading stops at MAX_PAGE_BYTES or once
+# enough passage text has been collected to fill the snippet several times.
+MAX_PAGE_BYTES = 512 * 1024
+CHUNK_BYTES = 16 * 1024
+MIN_PASSAGE_CHARS = 25
+_BLOCK_TAGS = {"p", "li", "blockquote", "dd", "td", "h1", "h2", "h3", "h4"}
+_SKIP_TAGS = {"script", "style", "noscript", "template", "svg"}
+_WORD_RE = re.compile(r"\w+")
+
+
+class _PassageParser(HTMLParser):
+    """Collect the meta description and block-level text passages of a page.
+
+    Works on partial input (feed() may be called per network chunk) and
+    never builds a document tree.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.description = ""
+        self.passages = []
+        self.chars = 0
+        self.done = False
+        self._skip = 0
+        self._depth = 0
+        self._buf = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+        elif tag == "meta":
+            if not self.description:
+                a = dict(attrs)
+                kind = (a.get("name") or a.get("property") or "").lower()
+                if kind in ("description", "og:description") and a.get("content"):
+                    self.description = a["content"].strip()
+        elif tag in _BLOCK_TAGS:
+            # flush on every block boundary so unclosed <p> tags still split
+            self._flush()
+            self._depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+            self._depth = max(0, self._depth - 1)
+        elif tag == "body":
+            self.done = True
+
+    def handle_data(self, data):
+        if self._depth and not self._skip:
+            self._buf.append(data)
+
+    def _flush(self):
+        text = " ".join("".join(self._buf).split())
+        self._buf = []
+        if len(text) >= MIN_PASSAGE_CHARS:
+            self.passages.append(text)
+            self.chars += len(text)
+
+
+def _bm25_scores(query: str, passages: list, k1: float = 1.5, b: float = 0.75) -> list:
+    """Score each passage against `query` with Okapi BM25."""
+    terms = set(_WORD_RE.findall(query.lower()))
+    docs = [_WORD_RE.findall(p.lower()) for p in passages]
+    if not terms or not docs:
+        return [0.0] * len(passages)
+    avgdl = (sum(len(d) for d in docs) / len(docs)) or 1.0
+    df = {t: sum(1 for d in docs if t in d) for t in terms}
+    n = len(docs)
+    scores = []
+    for d in docs:
+        score = 0.0
+        for t in terms:
+            tf = d.count(t)
+            if not tf:
+                continue
+            idf = math.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(d) / avgdl))
+        scores.append(score)
+    return scores
+
+
+def _select_snippet(query: str, description: str, passages: list, snippet_len: int) -> str:
+    """Fill `snippet_len` with the passages most relevant to `query`.
+
+    Falls back to the meta description (or first passage) when nothing on
+    the page matches the query.
+    """
+    candidates = ([description] if description else []) + passages
+    if not candidates:
+        return ""
+    scores = _bm25_scores(query, candidates)
+    ranked = sorted(range(len(candidates)), key=lambda i: -scores[i])
+    if scores[ranked[0]] <= 0:
+        return candidates[0][:snippet_len]
+    picked, used = [], 0
+    for i in ranked:
+        if scores[i] <= 0 or used >= snippet_len:
+            break
+        picked.append(i)
+        used += len(candidates[i]) + 3
+    # keep document order so the snippet reads naturally
+    return " … ".join(candidates[i] for i in sorted(picked))[:snippet_len]
+
+
+def _fetch_snippet(url: str, query: str, snippet_len: int, timeout: float, stop_at: float):
+    """Stream one result page and return (snippet, seconds spent waiting, seconds fetching)."""
+    queued = time.monotonic()
+    with _host_slot(url):
+        started = time.monotonic()
+        with _http_session().get(url, timeout=timeout, stream=True) as page:
+            page.raise_for_status()
+            ctype = page.headers.get("Content-Type", "")
+            if ctype and not ctype.startswith("text/") and "html" not in ctype and "xml" not in ctype:
+                raise ValueError(f"unsupported content type {ctype}")
+            decoder = codecs.getincrementaldecoder(page.encoding or "utf-8")(errors="replace")
+            parser = _PassageParser()
+            enough = max(4000, snippet_len * 8)
+            read = 0
+            for chunk in page.iter_content(chunk_size=CHUNK_BYTES):
+                read += len(chunk)
+                parser.feed(decoder.decode(chunk))
+                if parser.done or parser.chars >= enough or read >= MAX_PAGE_BYTES or time.monotonic() >= stop_at:
+                    break
+            tracing.current().add("http_bytes", read)
+            parser.feed(decoder.decode(b"", final=True))
+            parser._flush()
+        snippet = _select_snippet(query, parser.description, parser.passages, snippet_len)
+    return snippet, started - queued, time.monotonic() - started
+
+
+@cached("search_and_scrape", SEARCH_TTL, _search_cacheable)
+def search_and_scrape(query: str, top_n: int = 3, snippet_len: int = 500, timeout: int = 10, deadline: float = 15.0) -> str:
     """Search the web for `query` and scrape the top N result pages for up-to-date info.
 
     This function uses DuckDuckGo's HTML search endpoint to find result links, then
-    fetches each result and extracts a short snippet (meta description or first
-    paragraph). Returns a plain-text aggregation of titles, URLs and snippets.
+    streams the results concurrently and builds a short snippet from the page
+    passages that best match `query` (BM25), falling back to the meta description.
+    Returns a plain-text aggregation of titles, URLs and snippets.
+
+    `timeout` caps each individual request; `deadline` caps the whole call.
+    Pages that have not finished when the deadline passes are reported as
+    such and the snippets that did finish are returned.
 
     Notes and caveats:
     - Requires `requests` and `beautifulsoup4`. If they're not installed the
@@ -42,20 +319,23 @@ def search_and_scrape(query: str, top_n: int = 3, snippet_len: int = 500, timeou
       advanced politeness (robots.txt parsing), rate limiting, or JS rendering.
       Use responsibly and respect site terms of service.
     """
-    if requests is None or BeautifulSoup is None:
+    if requests is None or bs4 is None:
         return (
             "The search tool requires the 'requests' and 'beautifulsoup4' packages.\n"
             "Install with: pip install requests beautifulsoup4\n"
         )
 
-    headers = {"User-Agent": "Mozilla/5.0 (compatible; AutomationAgent/1.0)"}
+    t0 = time.monotonic()
+    end = t0 + deadline
     try:
-        resp = requests.get("https://html.duckduckgo.com/html/", params={"q": query}, headers=headers, timeout=timeout)
+        resp = _http_session().get(SEARCH_URL, params={"q": query}, timeout=min(timeout, deadline))
         resp.raise_for_status()
+        tracing.current().add("http_bytes", len(resp.content))
     except Exception as e:
         return f"Search request failed: {e}"
+    search_time = time.monotonic() - t0
 
-    soup = BeautifulSoup(resp.text, "html.parser")
+    soup = bs4.BeautifulSoup(resp.text, "html.parser")
 
     results = []
     # Try the DuckDuckGo result selector first
@@ -86,114 +366,244 @@ def search_and_scrape(query: str, top_n: int = 3, snippet_len: int = 500, timeou
     if not results:
         return "No search results found."
 
+    results = results[:top_n]
+    page_timeout = max(0.1, min(timeout, end - time.monotonic()))
+    pool = _fetch_executor()
+    # each page fetch runs in a copy of this context so its HTTP time is traced under the tool call
+    futures = [pool.submit(contextvars.copy_context().run, _fetch_snippet, url, query, snippet_len, page_timeout, end)
+               for _, url in results]
+    wait(futures, timeout=max(0.0, end - time.monotonic()))
+
     aggregated = []
-    for title, url in results[:top_n]:
+    pages = []  # per-host breakdown for tuning the pool size and timeouts
+    for (title, url), fut in zip(results, futures):
+        host = urllib.parse.urlparse(url).netloc
+        if not fut.done():
+            fut.cancel()
+            pages.append({"host": host, "status": "timeout"})
+            aggregated.append(f"Title: {title}\nURL: {url}\nError fetching page: not finished within {deadline}s deadline")
+            continue
         try:
-            page = requests.get(url, headers=headers, timeout=timeout)
-            page.raise_for_status()
-            page_soup = BeautifulSoup(page.text, "html.parser")
-            meta = page_soup.find("meta", attrs={"name": "description"}) or page_soup.find("meta", attrs={"property": "og:description"})
-            if meta and meta.get("content"):
-                desc = meta["content"].strip()
-            else:
-                p = page_soup.find("p")
-                desc = p.get_text().strip() if p else ""
-            snippet = desc[:snippet_len]
+            snippet, queued, fetched = fut.result()
+            pages.append({"host": host, "fetch_s": round(fetched, 3), "queued_s": round(queued, 3)})
             aggregated.append(f"Title: {title}\nURL: {url}\nSnippet: {snippet}")
         except Exception as e:
+            pages.append({"host": host, "status": "error"})
             aggregated.append(f"Title: {title}\nURL: {url}\nError fetching page: {e}")
 
+    tracing.current().set(search_s=round(search_time, 3), pages=pages, total_s=round(time.monotonic() - t0, 3))
     return "\n\n".join(aggregated)
 
-tools = [get_weather, run_cmd, search_and_scrape]
+tools = [get_weather, run_cmd, start_job, check_job, stop_job, search_and_scrape]
 
 
-def get_stock_quote(symbol: str) -> str:
-    """Return a short summary quote for the given stock symbol using yfinance.
+def _stooq_symbol(symbol: str) -> str:
+    s_param = symbol.lower()
+    if "." not in s_param:
+        # assume US ticker if no exchange provided
+        s_param = f"{s_param}.us"
+    return s_param
 
-    Example output: "AAPL — 175.23 USD (+1.2%) — Open: 174.00 Prev Close: 173.00"
-    """
-    if yf is None:
-        return "The stock tool requires 'yfinance' and 'pandas'. Install with: pip install yfinance pandas"
 
-    # Try a lightweight public CSV endpoint (Stooq) first to avoid Yahoo rate limits.
+def _stooq_quotes(symbols: list, timeout: float = 5) -> dict:
+    """Fetch last prices for `symbols` from Stooq in a single request.
+
+    Returns {symbol: (close, open)} for the symbols Stooq knows; misses are
+    simply absent. Network or parse errors yield an empty dict.
+    """
+    wanted = {_stooq_symbol(s).upper(): s for s in symbols}
     try:
-        s_param = symbol.lower()
-        if "." not in s_param:
-            # assume US ticker if no exchange provided
-            s_param = f"{s_param}.us"
-        r = requests.get(
-            "https://stooq.com/q/l/",
-            params={"s": s_param, "f": "sd2t2ohlcv", "h": "", "e": "csv"},
-            timeout=5,
+        r = _http_session().get(
+            STOOQ_URL,
+            params={"s": " ".join(_stooq_symbol(s) for s in symbols), "f": "sd2t2ohlcv", "h": "", "e": "csv"},
+            timeout=timeout,
         )
-        if r.ok:
-            lines = [l for l in r.text.splitlines() if l.strip()]
-            if len(lines) >= 2:
-                # CSV: Symbol,Date,Time,Open,High,Low,Close,Volume
-                parts = lines[1].split(',')
-                if len(parts) >= 8:
-                    close = parts[6]
-                    return f"{symbol.upper()} — {close} (source: stooq)"
+        if not r.ok:
+            return {}
+        tracing.current().add("http_bytes", len(r.content))
     except Exception:
-        pass
+        return {}
+    quotes = {}
+    # CSV: Symbol,Date,Time,Open,High,Low,Close,Volume (missing symbols report N/D)
+    for line in r.text.splitlines()[1:]:
+        parts = line.strip().split(',')
+        if len(parts) < 8 or parts[0].upper() not in wanted:
+            continue
+        try:
+            close = float(parts[6])
+        except ValueError:
+            continue
+        try:
+            open_ = float(parts[3])
+        except ValueError:
+            open_ = None
+        quotes[wanted[parts[0].upper()]] = (close, open_)
+    return quotes
+
+
+def _price_change(price, prev):
+    """Return (change, pct) of `price` against `prev`, or (None, None)."""
+    if not prev or price is None:
+        return None, None
+    change = price - prev
+    try:
+        return change, (change / prev) * 100
+    except Exception:
+        return change, None
 
-    # Try using yfinance next: fast_info, then Ticker.info, then history as fallback.
+
+def _quote_line(symbol: str, price, prev=None, source: Optional[str] = None) -> str:
+    change, pct = _price_change(price, prev)
+    out = f"{symbol.upper()} — {price}"
+    if pct is not None:
+        out += f" ({change:+.2f}, {pct:+.2f}%)"
+    if prev:
+        out += f" — Prev Close: {prev}"
+    if source:
+        out += f" (source: {source})"
+    return out
+
+
+def _yf_batch_quotes(symbols: list) -> dict:
+    """Fetch last and previous daily closes for `symbols` with one yf.download call.
+
+    Returns {symbol: (price, prev)} for the symbols that came back with data.
+    """
+    if not symbols:
+        return {}
     try:
-        t = yf.Ticker(symbol)
+        df = yf.download(symbols, period='5d', interval='1d', group_by='ticker', progress=False, threads=True)
+    except Exception:
+        return {}
+    if df is None or df.empty:
+        return {}
+    quotes = {}
+    for sym in symbols:
+        try:
+            closes = df[sym]['Close'] if isinstance(df.columns, pd.MultiIndex) else df['Close']
+        except KeyError:
+            continue
+        closes = closes.dropna()
+        if closes.empty:
+            continue
+        quotes[sym] = (float(closes.iloc[-1]), float(closes.iloc[-2]) if len(closes) >= 2 else None)
+    return quotes
+
+
+def _yf_ticker_quote(symbol: str):
+    """Return (price, prev) for one symbol via yfinance, or None if no data.
+
+    Tries fast_info, then Ticker.info, then recent intraday history.
+    """
+    t = yf.Ticker(symbol)
+    price = None
+    prev = None
+
+    # fast_info is a lightweight source when available
+    try:
+        fi = getattr(t, 'fast_info', None)
+        if fi:
+            price = fi.get('last_price') or fi.get('last_trade_price') or fi.get('last_price')
+            prev = fi.get('previous_close') or fi.get('previous_close')
+    except Exception:
         price = None
-        prev = None
 
-        # fast_info is a lightweight source when available
+    # Try Ticker.info which may contain regularMarketPrice
+    if price is None:
         try:
-            fi = getattr(t, 'fast_info', None)
-            if fi:
-                price = fi.get('last_price') or fi.get('last_trade_price') or fi.get('last_price')
-                prev = fi.get('previous_close') or fi.get('previous_close')
+            info = t.info
+            price = info.get('regularMarketPrice') or info.get('currentPrice') or info.get('previousClose')
+            prev = info.get('regularMarketPreviousClose') or info.get('previousClose') or info.get('open')
         except Exception:
-            price = None
+            pass
 
-        # Try Ticker.info which may contain regularMarketPrice
-        if price is None:
-            try:
-                info = t.info
-                price = info.get('regularMarketPrice') or info.get('currentPrice') or info.get('previousClose')
-                prev = info.get('regularMarketPreviousClose') or info.get('previousClose') or info.get('open')
-            except Exception:
-                pass
-
-        # Last-resort: fetch recent history and derive last close
-        if price is None:
-            hist = t.history(period='5d', interval='1m')
-            if not hist.empty:
-                last = hist['Close'].dropna()
-                if not last.empty:
-                    price = float(last.iloc[-1])
-                    prev = float(last.iloc[-2]) if len(last) >= 2 else None
-                else:
-                    return f"No recent price data for {symbol}"
-            else:
-                return f"No recent price data for {symbol}"
-
-        change = None
-        pct = None
-        if prev:
-            change = price - prev
-            try:
-                pct = (change / prev) * 100
-            except Exception:
-                pct = None
-
-        out = f"{symbol.upper()} — {price}"
-        if pct is not None:
-            out += f" ({change:+.2f}, {pct:+.2f}%)"
-        if prev:
-            out += f" — Prev Close: {prev}"
-        return out
+    # Last-resort: fetch recent history and derive last close
+    if price is None:
+        hist = t.history(period='5d', interval='1m')
+        if hist.empty:
+            return None
+        last = hist['Close'].dropna()
+        if last.empty:
+            return None
+        price = float(last.iloc[-1])
+        prev = float(last.iloc[-2]) if len(last) >= 2 else None
+
+    return price, prev
+
+
+@cached("get_stock_quote", QUOTE_TTL, _cacheable)
+def get_stock_quote(symbol: str) -> str:
+    """Return a short summary quote for the given stock symbol using yfinance.
+
+    Example output: "AAPL — 175.23 USD (+1.2%) — Open: 174.00 Prev Close: 173.00"
+    """
+    if yf is None:
+        return "The stock tool requires 'yfinance' and 'pandas'. Install with: pip install yfinance pandas"
+
+    # Try a lightweight public CSV endpoint (Stooq) first to avoid Yahoo rate limits.
+    quote = _stooq_quotes([symbol]).get(symbol)
+    if quote:
+        return _quote_line(symbol, quote[0], source="stooq")
+
+    # Try using yfinance next: fast_info, then Ticker.info, then history as fallback.
+    try:
+        quote = _yf_ticker_quote(symbol)
+        if quote is None:
+            return f"No recent price data for {symbol}"
+        return _quote_line(symbol, *quote)
     except Exception as e:
         return f"Failed to fetch quote for {symbol}: {e}"
 
 
+@cached("get_stock_quotes", QUOTE_TTL, _cacheable)
+def get_stock_quotes(symbols: list[str]) -> str:
+    """Return quotes for several stock symbols at once as a compact CSV table.
+
+    Use this instead of calling get_stock_quote repeatedly for a watchlist.
+    All symbols are fetched with one Stooq request; symbols Stooq misses are
+    fetched together with one yfinance download, and only the remaining
+    misses fall back to the per-symbol yfinance lookup.
+    """
+    if yf is None or pd is None:
+        return "The stock tool requires 'yfinance' and 'pandas'. Install with: pip install yfinance pandas"
+
+    symbols = list(dict.fromkeys(s.strip() for s in symbols if s and s.strip()))
+    if not symbols:
+        return "No symbols given."
+
+    rows = {}
+    for sym, (close, _) in _stooq_quotes(symbols).items():
+        rows[sym] = (close, None, "stooq")
+    misses = [s for s in symbols if s not in rows]
+    for sym, (price, prev) in _yf_batch_quotes(misses).items():
+        rows[sym] = (price, prev, "yfinance")
+
+    lines = ["Symbol,Price,Change,Pct,PrevClose,Source"]
+    for sym in symbols:
+        if sym not in rows:
+            # per-symbol fallback only for what both batch sources missed
+            try:
+                quote = _yf_ticker_quote(sym)
+            except Exception:
+                quote = None
+            if quote is None:
+                lines.append(f"{sym.upper()},,,,,no data")
+                continue
+            rows[sym] = (quote[0], quote[1], "yfinance")
+        price, prev, source = rows[sym]
+        change, pct = _price_change(price, prev)
+        lines.append(",".join([
+            sym.upper(),
+            f"{price:.2f}",
+            f"{change:+.2f}" if change is not None else "",
+            f"{pct:+.2f}%" if pct is not None else "",
+            f"{prev:.2f}" if prev else "",
+            source,
+        ]))
+    return "\n".join(lines)
+
+
+@cached("get_historical", _history_ttl, _cacheable)
 def get_historical(symbol: str, period: str = '1mo', interval: str = '1d', rows: int = 30) -> str:
     """Return recent historical OHLC data for `symbol` as plain text.
 
@@ -205,26 +615,47 @@ def get_historical(symbol: str, period: str = '1mo', interval: str = '1d', rows:
 
     try:
         t = yf.Ticker(symbol)
-        hist = t.history(period=period, interval=interval)
-        if hist.empty:
+        # Bars come from the local store, which only asks Yahoo for what it lacks.
+        bars, tz = market_store.default_store.bars(
+            symbol, period, interval, lambda **kw: t.history(interval=interval, **kw))
+        if not len(bars):
             return f"No historical data for {symbol} with period={period} interval={interval}"
-        # Take last `rows` rows
-        df = hist[['Open', 'High', 'Low', 'Close', 'Volume']].tail(rows)
-        # Format into a compact CSV-style string
-        lines = ["Date,Open,High,Low,Close,Volume"]
-        for idx, row in df.iterrows():
-            date = idx.strftime('%Y-%m-%d %H:%M') if hasattr(idx, 'strftime') else str(idx)
-            lines.append(f"{date},{row['Open']:.2f},{row['High']:.2f},{row['Low']:.2f},{row['Close']:.2f},{int(row['Volume'])}")
-        return "\n".join(lines)
+        # Take last `rows` rows as a compact CSV-style string
+        return market_store.bars_to_csv(bars[-rows:], tz)
     except Exception as e:
         return f"Failed to fetch historical data for {symbol}: {e}"
 
 
-def get_options_chain(symbol: str, date: Optional[str] = None, top_n: int = 10) -> str:
-    """Return an options chain summary for `symbol`.
+def _spot_price(t) -> Optional[float]:
+    try:
+        fi = getattr(t, 'fast_info', None)
+        price = fi.get('last_price') if fi else None
+        if price:
+            return float(price)
+    except Exception:
+        pass
+    hist = t.history(period='5d', interval='1d')
+    closes = hist['Close'].dropna() if not hist.empty else hist
+    return float(closes.iloc[-1]) if len(closes) else None
+
+
+def _chain_frame(t, expiry: str):
+    """Return calls and puts for one expiry as a single DataFrame."""
+    chain = t.option_chain(expiry)
+    calls = chain.calls.assign(type='C', expiry=expiry)
+    puts = chain.puts.assign(type='P', expiry=expiry)
+    return pd.concat([calls, puts], ignore_index=True)
+
+
+@cached("get_options_chain", OPTIONS_TTL, _cacheable)
+def get_options_chain(symbol: str, date: Optional[str] = None, top_n: int = 10, num_expiries: int = 1) -> str:
+    """Return an options chain summary with implied volatility and Greeks for `symbol`.
 
-    If `date` is None, uses the nearest expiry. Date should be a string in
-    the format returned by yfinance (YYYY-MM-DD).
+    If `date` is None, uses the nearest `num_expiries` expiries. `date` may
+    also be one or more comma-separated expiries in the format returned by
+    yfinance (YYYY-MM-DD). For each expiry the `top_n` calls and puts with
+    strikes nearest the spot price are listed with IV, delta, gamma, theta
+    (per day) and vega (per vol point).
     """
     if yf is None or pd is None:
         return "The options tool requires 'yfinance' and 'pandas'. Install with: pip install yfinance pandas"
@@ -234,29 +665,50 @@ def get_options_chain(symbol: str, date: Optional[str] = None, top_n: int = 10)
         expiries = t.options
         if not expiries:
             return f"No options data available for {symbol}"
-        use_date = date or expiries[0]
-        if use_date not in expiries:
-            # try to find closest
-            use_date = expiries[0]
-
-        chain = t.option_chain(use_date)
-        calls = chain.calls.head(top_n)
-        puts = chain.puts.head(top_n)
-
-        def df_to_text(df):
-            lines = []
-            for _, r in df.iterrows():
-                lines.append(f"{int(r['contractSymbol']) if 'contractSymbol' in r and isinstance(r['contractSymbol'], (int,)) else r.get('contractSymbol', '')}: strike={r.get('strike','')}, last={r.get('lastPrice','')}, bid={r.get('bid','')}, ask={r.get('ask','')}, vol={int(r.get('volume') or 0)}")
-            return "\n".join(lines) or "(no rows)"
-
-        out = [f"Options for {symbol} expiry {use_date}", "\nCalls:\n" + df_to_text(calls), "\nPuts:\n" + df_to_text(puts)]
+        if date:
+            # unknown dates fall back to the nearest expiry
+            use_dates = [d.strip() if d.strip() in expiries else expiries[0] for d in date.split(',') if d.strip()]
+            use_dates = list(dict.fromkeys(use_dates))
+        else:
+            use_dates = list(expiries[:max(1, num_expiries)])
+
+        spot = _spot_price(t)
+        if not spot:
+            return f"No spot price available for {symbol}"
+
+        # fetch the expiries concurrently, then price the whole chain in one batch
+        chain = pd.concat(list(_fetch_executor().map(lambda d: _chain_frame(t, d), use_dates)), ignore_index=True)
+        if chain.empty:
+            return f"No options data available for {symbol}"
+
+        strike = chain['strike'].to_numpy(dtype=float)
+        bid = chain['bid'].to_numpy(dtype=float, na_value=np.nan)
+        ask = chain['ask'].to_numpy(dtype=float, na_value=np.nan)
+        last = chain['lastPrice'].to_numpy(dtype=float, na_value=np.nan)
+        mid = np.where((bid > 0) & (ask > 0), (bid + ask) / 2, last)
+        # expiries settle at the US close (~20:00 UTC)
+        expiry_ts = pd.to_datetime(chain['expiry']).dt.tz_localize('UTC') + pd.Timedelta(hours=20)
+        years = ((expiry_ts - pd.Timestamp.now(tz='UTC')).dt.total_seconds().to_numpy() / (365 * 86400)).clip(min=1 / (365 * 24))
+        is_call = (chain['type'] == 'C').to_numpy()
+        chain = chain.assign(**options_math.greeks(mid, spot, strike, years, is_call), dist=np.abs(strike - spot))
+
+        # nearest-to-spot strikes per expiry and side, listed by strike
+        near = chain.sort_values('dist').groupby(['expiry', 'type'], sort=False).head(top_n)
+        near = near.sort_values(['expiry', 'type', 'strike'])
+        near = near.assign(volume=near['volume'].fillna(0).astype(int))
+        cols = ['contractSymbol', 'strike', 'lastPrice', 'bid', 'ask', 'volume', 'iv', 'delta', 'gamma', 'theta', 'vega']
+
+        out = [f"Options for {symbol} (spot {spot:.2f})"]
+        for (expiry, side), rows in near.groupby(['expiry', 'type'], sort=False):
+            table = rows[cols].to_csv(index=False, float_format='%.4g', lineterminator='\n').rstrip('\n')
+            out.append(f"{'Calls' if side == 'C' else 'Puts'} expiry {expiry}:\n{table}")
         return "\n\n".join(out)
     except Exception as e:
         return f"Failed to fetch options chain for {symbol}: {e}"
 
 
 # export new tools
-tools.extend([get_stock_quote, get_historical, get_options_chain])
+tools.extend([get_stock_quote, get_stock_quotes, get_historical, get_options_chain])
 
 
 def send_gmail(to_address: str, subject: str, body: str, cc: Optional[str] = None, bcc: Optional[str] = None, html: bool = False) -> str:
@@ -271,16 +723,12 @@ def send_gmail(to_address: str, subject: str, body: str, cc: Optional[str] = Non
 
     Returns a status message on success or instructions on missing credentials.
     """
-    import smtplib
     from email.message import EmailMessage
 
-    user = os.environ["GMAIL_USER"]
-    password = os.environ["GMAIL_PASS"]
-    print("user:", user)
-    print("password:", password)
-    if not user or not password:
-        return ("Missing Gmail credentials. Set environment variables GMAIL_USER and GMAIL_PASS.\n"
-                "If you use 2FA, create an app password in your Google Account and use it as GMAIL_PASS.")
+    creds = gmail.credentials()
+    if creds is None:
+        return gmail.MISSING_CREDENTIALS
+    user = creds[0]
 
     msg = EmailMessage()
     msg['From'] = user
@@ -300,11 +748,8 @@ def send_gmail(to_address: str, subject: str, body: str, cc: Optional[str] = Non
         recipients += [b.strip() for b in bcc.split(',') if b.strip()]
 
     try:
-        with smtplib.SMTP('smtp.gmail.com', 587, timeout=20) as smtp:
-            smtp.ehlo()
-            smtp.starttls()
-            smtp.login(user, password)
-            smtp.send_message(msg, from_addr=user, to_addrs=recipients)
+        # reuses a pooled, already-authenticated SMTP session when one is available
+        gmail.send_messages([(msg, recipients)], from_addr=user)
         return f"Email sent to {to_address} (cc={cc or ''} bcc={bcc or ''})"
     except Exception as e:
         return f"Failed to send email: {e}"
@@ -315,65 +760,59 @@ def read_gmail(folder: str = 'INBOX', criteria: str = 'ALL', limit: int = 10) ->
 
     Authentication: same as send_gmail (GMAIL_USER / GMAIL_PASS env vars).
     `criteria` is an IMAP search criteria string, e.g., 'UNSEEN', 'FROM "abc@"', 'SINCE 01-Jan-2025', or 'ALL'.
+    Messages are not marked as read.
     """
-    import imaplib
-    import email
+    if gmail.credentials() is None:
+        return gmail.MISSING_CREDENTIALS
 
-    user = os.environ["GMAIL_USER"]
-    password = os.environ["GMAIL_PASS"]
-    print("user:", user)
-    print("password:", password)
-    if not user or not password:
-        return ("Missing Gmail credentials. Set environment variables GMAIL_USER and GMAIL_PASS.\n"
-                "If you use 2FA, create an app password in your Google Account and use it as GMAIL_PASS.")
+    # answer from the local mirror when it holds the whole folder and the criteria mean the same there
+    query = mail_mirror.criteria_to_query(criteria)
+    if query is not None:
+        try:
+            mirror = mail_mirror.default_mirror()
+            if mirror.covers(folder):
+                summaries = mirror.query(folder=folder, limit=limit, **query)
+                return gmail.format_summaries(summaries) if summaries else "No messages found."
+        except Exception:
+            pass
 
     try:
-        imap = imaplib.IMAP4_SSL('imap.gmail.com')
-        imap.login(user, password)
-        imap.select(folder)
-        typ, data = imap.search(None, criteria)
-        if typ != 'OK':
-            imap.logout()
-            return f"IMAP search failed: {typ}"
-        ids = data[0].split()
-        if not ids:
-            imap.logout()
+        with gmail.imap_pool.connection() as imap:
+            summaries = gmail.fetch_summaries(imap, folder, criteria, limit)
+        if summaries is None:
+            return "IMAP search failed"
+        if not summaries:
             return "No messages found."
-        # get last `limit` messages
-        ids = ids[-limit:]
-        summaries = []
-        for num in reversed(ids):
-            typ, msg_data = imap.fetch(num, '(RFC822)')
-            if typ != 'OK':
-                continue
-            raw = msg_data[0][1]
-            msg = email.message_from_bytes(raw)
-            subj = msg.get('Subject', '(no subject)')
-            frm = msg.get('From', '')
-            date = msg.get('Date', '')
-            # extract a short snippet
-            snippet = ''
-            if msg.is_multipart():
-                for part in msg.walk():
-                    ctype = part.get_content_type()
-                    if ctype == 'text/plain' and not part.get('Content-Disposition'):
-                        try:
-                            snippet = part.get_payload(decode=True).decode(errors='ignore').strip()
-                            break
-                        except Exception:
-                            continue
-            else:
-                try:
-                    snippet = msg.get_payload(decode=True).decode(errors='ignore').strip()
-                except Exception:
-                    snippet = ''
-            snippet = (snippet or '')[:400].replace('\n', ' ')
-            summaries.append(f"From: {frm}\nSubject: {subj}\nDate: {date}\nSnippet: {snippet}")
-        imap.logout()
-        return "\n\n".join(summaries)
+        return gmail.format_summaries(summaries)
     except Exception as e:
         return f"Failed to read Gmail: {e}"
 
 
+def search_mail(text: Optional[str] = None, sender: Optional[str] = None, since: Optional[str] = None,
+                until: Optional[str] = None, folder: str = 'INBOX', limit: int = 10) -> str:
+    """Search a local mirror of the Gmail mailbox (fast; use for sender, date or keyword questions).
+
+    `text` is matched against sender, subject and snippet; `sender` is a
+    substring of the From header; `since`/`until` are dates as YYYY-MM-DD.
+    The mirror syncs new messages incrementally and keeps itself refreshed in
+    the background. Use read_gmail for flag-based criteria such as UNSEEN.
+    """
+    if gmail.credentials() is None:
+        return gmail.MISSING_CREDENTIALS
+
+    try:
+        mirror = mail_mirror.default_mirror()
+        if not mirror.is_fresh(folder):
+            mirror.sync(folder)
+        if folder == 'INBOX':
+            mirror.start_background_refresh(folder)
+        summaries = mirror.query(folder=folder, sender=sender, since=since, until=until, text=text, limit=limit)
+        if not summaries:
+            return "No messages found."
+        return gmail.format_summaries(summaries)
+    except Exception as e:
+        return f"Failed to search mail: {e}"
+
+
 # add gmail tools to exported list
-tools.extend([send_gmail, read_gmail])
\ No newline at end of file
+tools.extend([send_gmail, read_gmail, search_mail])
\ No newline at end of file
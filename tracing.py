@@ -0,0 +1,231 @@
+import contextvars, itertools, json, os, threading, time
+from collections import deque
+from langchain_core.callbacks import BaseCallbackHandler
+
+''' Turn tracing
+
+With tracing enabled (--trace), each turn is recorded as a tree of spans:
+"turn" at the root, with "stt", "llm" (one per model call), "tool:<name>"
+(arguments, result bytes, upstream HTTP calls/time/bytes; per-host fetch and
+queue times for web searches) and "tts" (one per spoken chunk) below it. Finished spans are appended to a JSONL file
+and their durations feed rolling per-stage histograms; summary() prints
+p50/p95/p99 for each stage.
+
+When tracing is off, span() and current() return a shared no-op object, so
+instrumented code pays one attribute check per span.
+
+The current span is held in a context variable, so work started from it on
+other threads is attributed to it as long as the context is copied (the
+tool runner does so for every tool call).
+'''
+
+TRACE_PATH = os.environ.get("TRACE_PATH") or ".trace.jsonl"
+WINDOW = 1000   # recent spans per stage kept for the percentiles
+
+enabled = False
+_path = None
+_file = None
+_lock = threading.Lock()
+_current = contextvars.ContextVar("trace_span", default=None)
+_ids = itertools.count(1)
+_durations = {}  # stage -> deque of recent durations (seconds)
+
+
+class Span:
+    __slots__ = ("id", "name", "parent", "turn", "attrs", "started", "_start", "_token")
+
+    def __init__(self, name: str, parent=None, attrs=None):
+        self.id = next(_ids)
+        self.name = name
+        self.parent = parent.id if parent is not None else None
+        self.turn = parent.turn if parent is not None else self.id
+        self.attrs = attrs or {}
+        self._token = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key: str, value):
+        """Accumulate a numeric attribute (e.g. HTTP time over several requests)."""
+        self.attrs[key] = self.attrs.get(key, 0) + value
+
+    def begin(self):
+        self.started = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def end(self, error: str = None):
+        duration = time.perf_counter() - self._start
+        if error:
+            self.attrs["error"] = error
+        _record(self, duration)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self.begin()
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        self.end(f"{exc_type.__name__}: {exc}" if exc_type else None)
+        return False
+
+
+class _NoSpan:
+    """Stand-in returned while tracing is off; every operation is a no-op."""
+    id = turn = None
+
+    def set(self, **attrs):
+        pass
+
+    def add(self, key, value):
+        pass
+
+    def begin(self):
+        return self
+
+    def end(self, error=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+def span(name: str, parent=None, **attrs):
+    """Return a span for `name` under `parent` (default: the current span); use as a context manager."""
+    if not enabled:
+        return NO_SPAN
+    if parent is None:
+        parent = _current.get()
+    return Span(name, parent if isinstance(parent, Span) else None, attrs)
+
+
+def current():
+    """Return the innermost open span (NO_SPAN if none or tracing is off)."""
+    if not enabled:
+        return NO_SPAN
+    return _current.get() or NO_SPAN
+
+
+def record(name: str, seconds: float, parent=None, **attrs):
+    """Record a span measured elsewhere that ended just now."""
+    s = span(name, parent, **attrs)
+    if s is NO_SPAN or seconds is None:
+        return
+    s.started = time.time() - seconds
+    _record(s, seconds)
+
+
+def _record(s: Span, duration: float):
+    line = {"turn": s.turn, "span": s.id, "parent": s.parent, "name": s.name, "start": round(s.started, 6),
+            "ms": round(duration * 1000, 3), **s.attrs}
+    stage = "tool" if s.name.startswith("tool:") else None
+    with _lock:
+        for key in (s.name, stage):
+            if key:
+                window = _durations.get(key)
+                if window is None:
+                    window = _durations[key] = deque(maxlen=WINDOW)
+                window.append(duration)
+        if _file is not None:
+            _file.write(json.dumps(line, default=str, ensure_ascii=False) + "\n")
+            if s.parent is None:
+                _file.flush()
+
+
+def enable(path: str = TRACE_PATH):
+    """Start tracing, appending spans to `path` (None: histograms only)."""
+    global enabled, _file, _path
+    with _lock:
+        if path and _file is None:
+            _file = open(path, "a", encoding="utf-8")
+            _path = path
+        enabled = True
+
+
+def disable():
+    global enabled, _file
+    with _lock:
+        enabled = False
+        if _file is not None:
+            _file.close()
+            _file = None
+
+
+def percentiles(stage: str) -> dict:
+    with _lock:
+        values = sorted(_durations.get(stage, ()))
+    if not values:
+        return {}
+    pick = lambda p: values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+    return {"count": len(values), "p50": pick(50), "p95": pick(95), "p99": pick(99)}
+
+
+def histograms() -> dict:
+    with _lock:
+        stages = list(_durations)
+    return {stage: percentiles(stage) for stage in stages}
+
+
+def summary() -> str:
+    """Return a table of recent span durations per stage, in milliseconds."""
+    if not enabled:
+        return "tracing is off (start with --trace)"
+    stats = histograms()
+    if not stats:
+        return "trace: no spans recorded yet"
+    order = lambda k: ({"turn": 0, "stt": 1, "llm": 2, "tool": 3, "tts": 5}.get(k, 4), k)
+    width = max(len(k) for k in stats)
+    lines = [f"{'stage':<{width}}  count     p50     p95     p99  (ms, last {WINDOW})"]
+    for stage in sorted(stats, key=order):
+        s = stats[stage]
+        lines.append(f"{stage:<{width}}  {s['count']:5d} {s['p50'] * 1000:7.0f} {s['p95'] * 1000:7.0f} {s['p99'] * 1000:7.0f}")
+    if _path:
+        lines.append(f"spans written to {_path}")
+    return "\n".join(lines)
+
+
+def langchain_callbacks() -> list:
+    """Callback handlers that record a span per model call; empty when tracing is off."""
+    if not enabled:
+        return []
+    return [_LLMSpans()]
+
+
+class _LLMSpans(BaseCallbackHandler):
+    """Open an "llm" span when a chat model starts and close it when it ends."""
+
+    def __init__(self):
+        self._open = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        name = (kwargs.get("metadata") or {}).get("ls_model_name")
+        s = span("llm", messages=sum(len(m) for m in messages))
+        if name:
+            s.set(model=name)
+        self._open[run_id] = s.begin()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        s = self._open.pop(run_id, None)
+        if s is None:
+            return
+        for gens in response.generations:
+            for gen in gens:
+                usage = getattr(getattr(gen, "message", None), "usage_metadata", None)
+                if usage:
+                    s.add("tokens_in", usage.get("input_tokens", 0))
+                    s.add("tokens_out", usage.get("output_tokens", 0))
+                tool_calls = getattr(getattr(gen, "message", None), "tool_calls", None)
+                if tool_calls:
+                    s.set(tool_calls=[c["name"] for c in tool_calls])
+        s.end()
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        s = self._open.pop(run_id, None)
+        if s is not None:
+            s.end(f"{type(error).__name__}: {error}")
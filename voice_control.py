@@ -1,25 +1,476 @@
-import sounddevice as sd, json, pyttsx3, constants
+import json, re, time, queue, threading, constants, tracing
+from startup import lazy_import
+
+# audio libraries are only loaded once speech is actually used
+sd = lazy_import("sounddevice")
+np = lazy_import("numpy")
+pyttsx3 = lazy_import("pyttsx3")
 
 ''' Text to speech '''
-def t2s(text):
-    engine = pyttsx3.init()
+_SENTENCE_END = re.compile(r'(?<=[.!?;:])\s+')
+ECHO_TAIL = 0.3         # seconds the room keeps echoing a reply after playback stops
+
+
+class _Speaker:
+    """Long-lived speech worker.
+
+    The pyttsx3 engine is created once on a dedicated thread (engines must be
+    driven from the thread that created them) and speaks sentence chunks
+    pulled from a queue, so speech starts after the first sentence and the
+    caller never blocks. cancel() drops everything queued and stops the
+    current chunk (barge-in); the stop itself is issued from the worker, in
+    the engine's word callback. audible_at() tells the recognizer whether a
+    block of microphone audio may contain our own voice. If the engine cannot
+    be created the speaker disables itself and say() becomes a no-op.
+    """
+
+    def __init__(self, rate: int = 180):
+        self.rate = rate
+        self._q = queue.Queue()
+        self._pending = 0
+        self._generation = 0
+        self._idle = threading.Event()
+        self._idle.set()
+        self._thread = None
+        self._engine = None
+        self._lock = threading.Lock()
+        self._pending_first = None  # enqueue time of an utterance not yet audible
+        self._speaking_generation = None
+        self._cancelled = None      # generation already cancelled (barge-in fires once)
+        self._playing_since = None  # start of the current playback
+        self._played = (0.0, 0.0)   # (start, end) of the last finished playback
+        self.disabled = False
+        self.error = None
+        self.stats = {"utterances": 0, "cancelled": 0, "engine_init": None,
+                      "first_audio_last": None, "first_audio_total": 0.0, "first_audio_count": 0}
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="tts", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        t0 = time.monotonic()
+        try:
+            engine = pyttsx3.init()
+            engine.setProperty("rate", self.rate)   # speed
+            # engine.setProperty("volume", 0.9) # 0–1
+            # voices = engine.getProperty("voices")
+            # engine.setProperty("voice", voices[2].id)  # pick a voice
+            engine.connect("started-utterance", self._on_started)
+            engine.connect("started-word", self._on_word)
+        except Exception as e:
+            self._disable(e)
+            return
+        self._engine = engine
+        self.stats["engine_init"] = time.monotonic() - t0
+        while True:
+            generation, chunk, parent = self._q.get()
+            if generation == self._generation:
+                self._speaking_generation = generation
+                try:
+                    with tracing.span("tts", parent=parent, chars=len(chunk)):
+                        engine.say(chunk)
+                        engine.runAndWait()
+                except Exception as e:
+                    # a broken chunk must not leave the speaker "playing" forever
+                    self.error = e
+                self._speaking_generation = None
+            with self._lock:
+                self._pending -= 1
+                if not self._pending:
+                    self._played = (self._playing_since or time.monotonic(), time.monotonic())
+                    self._playing_since = None
+                    self._idle.set()
+
+    def _disable(self, error: Exception):
+        """Give up on speech: drop everything queued and report idle, not playing."""
+        with self._lock:
+            self.disabled = True
+            self.error = error
+            while True:
+                try:
+                    self._q.get_nowait()
+                except queue.Empty:
+                    break
+            self._pending = 0
+            self._pending_first = None
+            self._playing_since = None
+            self._idle.set()
+        print(f"Text-to-speech unavailable ({error}) — replies will only be printed.")
+
+    def _on_word(self, name, location, length):
+        # runs on the worker inside runAndWait, the only thread allowed to drive the engine
+        if self._speaking_generation is not None and self._speaking_generation != self._generation:
+            self._engine.stop()
+
+    def _on_started(self, name):
+        started = self._pending_first
+        if started is not None:
+            self._pending_first = None
+            elapsed = time.monotonic() - started
+            self.stats["first_audio_last"] = elapsed
+            self.stats["first_audio_total"] += elapsed
+            self.stats["first_audio_count"] += 1
+
+    def say(self, text: str):
+        """Queue `text` for speech, one sentence per chunk."""
+        chunks = [c.strip() for c in _SENTENCE_END.split(text or "") if c.strip()]
+        if not chunks or self.disabled:
+            return
+        self._start()
+        with self._lock:
+            if self.disabled:
+                return
+            self.stats["utterances"] += 1
+            if self._pending_first is None:
+                self._pending_first = time.monotonic()
+            self._cancelled = None
+            self._pending += len(chunks)
+            if self._playing_since is None:
+                self._playing_since = time.monotonic()
+            self._idle.clear()
+            generation = self._generation
+            # spoken later on the worker thread, but traced under the caller's turn
+            parent = tracing.current()
+            for chunk in chunks:
+                self._q.put((generation, chunk, parent))
+
+    def cancel(self):
+        """Drop queued speech and stop the sentence being spoken."""
+        if self._idle.is_set() or self._cancelled == self._generation:
+            return
+        self._generation += 1
+        self._cancelled = self._generation
+        self._pending_first = None
+        self.stats["cancelled"] += 1
+
+    def audible_at(self, t: float) -> bool:
+        """Whether speech (or its echo) may have been playing at monotonic time `t`."""
+        since = self._playing_since
+        if since is not None and t >= since:
+            return True
+        start, end = self._played
+        return start <= t < end + ECHO_TAIL
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block until everything queued has been spoken (or cancelled)."""
+        return self._idle.wait(timeout)
+
+    def summary(self) -> str:
+        if self.disabled:
+            return f"tts: disabled ({self.error})"
+        s = self.stats
+        avg = s["first_audio_total"] / s["first_audio_count"] if s["first_audio_count"] else None
+        fmt = lambda v: f"{v:.3f}s" if v is not None else "n/a"
+        return (f"tts: {s['utterances']} utterances, {s['cancelled']} cancelled, engine init {fmt(s['engine_init'])}, "
+                f"time-to-first-audio last {fmt(s['first_audio_last'])} avg {fmt(avg)}")
+
+
+speaker = _Speaker()
+
 
-    engine.setProperty("rate", 180)   # speed
-    # engine.setProperty("volume", 0.9) # 0–1
-    # voices = engine.getProperty("voices")
-    # engine.setProperty("voice", voices[2].id)  # pick a voice
+def t2s(text, wait: bool = False):
+    """Speak `text` on the background speech worker.
 
-    engine.say(text)
-    engine.runAndWait()
-    engine.stop()
+    Returns immediately unless `wait` is true.
+    """
+    speaker.say(text)
+    if wait:
+        speaker.wait()
+
+
+def cancel_speech():
+    speaker.cancel()
 
 # 2, 4, 11, 13
 
 ''' Speech to text '''
+# Capture and recognition run off the main thread. The PortAudio callback
+# copies each block into a preallocated ring; a recognizer thread reads the
+# ring, endpoints utterances (energy gate plus `constants.trailing_silence`
+# seconds of quiet) and puts finished transcripts on a queue. Between turns
+# the audio is discarded, as before, unless pre-transcription is requested:
+# then it keeps listening while a turn runs, and s2t() returns an utterance
+# spoken during the previous reply straight away.
+_stream = None
+s2t_stats = {"utterances": 0, "pretranscribed": 0, "dropped_blocks": 0, "latency_last": None, "latency_total": 0.0,
+             "idle_wall": 0.0, "idle_cpu": 0.0, "audio_s": 0.0, "decode_s": 0.0}
+
+
+class AudioRing:
+    """Fixed-size ring of audio blocks shared by the capture callback and the recognizer.
+
+    Storage is allocated once: write() copies a block into its slot (PortAudio
+    reuses its buffer, so that copy cannot be avoided) and read() returns a
+    view of the slot. If the reader falls `capacity` blocks behind, the oldest
+    blocks are overwritten and counted as dropped.
+    """
+
+    def __init__(self, capacity: int, blocksize: int, channels: int = 1):
+        self.capacity = capacity
+        self._data = np.zeros((capacity, blocksize * channels), dtype=np.int16)
+        self._frames = np.zeros(capacity, dtype=np.int64)
+        self._captured = np.zeros(capacity, dtype=np.float64)
+        self._written = 0      # blocks written since creation
+        self._read = 0         # blocks handed to the reader
+        self._cond = threading.Condition()
+
+    def write(self, indata, captured: float) -> int:
+        """Store one block; return how many unread blocks it overwrote."""
+        samples = np.frombuffer(indata, dtype=np.int16)
+        with self._cond:
+            slot = self._written % self.capacity
+            n = min(samples.size, self._data.shape[1])
+            self._data[slot, :n] = samples[:n]
+            self._frames[slot] = n
+            self._captured[slot] = captured
+            self._written += 1
+            dropped = max(0, self._written - self._read - self.capacity)
+            self._read += dropped
+            self._cond.notify()
+        return dropped
+
+    def read(self, timeout: float = None):
+        """Return (capture time, samples view) of the oldest unread block, or None on timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._read < self._written, timeout):
+                return None
+            slot = self._read % self.capacity
+            self._read += 1
+            return float(self._captured[slot]), self._data[slot, :self._frames[slot]]
+
+    def clear(self):
+        with self._cond:
+            self._read = self._written
+
+
+_ring = None
+_ring_lock = threading.Lock()
+
+
+def _audio_ring() -> AudioRing:
+    global _ring
+    if _ring is None:
+        with _ring_lock:
+            if _ring is None:
+                _ring = AudioRing(constants.max_queue_blocks, constants.blocksize, constants.channels)
+    return _ring
+
+
 def callback(indata, frames, time, status):
-    constants.q.put(bytes(indata))
+    # `time` here is PortAudio's timing struct, hence the _now() helper
+    dropped = _audio_ring().write(indata, _now())
+    if status is not None and getattr(status, "input_overflow", False):
+        dropped += 1
+    if dropped:
+        s2t_stats["dropped_blocks"] += dropped
+
+
+def _now():
+    return time.monotonic()
+
+
+def _ensure_stream():
+    global _stream
+    if _stream is None:
+        _stream = sd.RawInputStream(samplerate=constants.samplerate, blocksize=constants.blocksize, dtype='int16',
+                                    channels=constants.channels, callback=callback)
+        _stream.start()
+        if hasattr(constants.rec, "SetEndpointerDelays"):
+            # let VOSK's own endpointer use the same trailing-silence window
+            constants.rec.SetEndpointerDelays(5.0, constants.trailing_silence, 20.0)
+    return _stream
+
 
-def s2t():
+def flush_audio():
+    """Discard captured audio and transcripts nobody has asked for yet."""
+    _audio_ring().clear()
+    while True:
+        try:
+            _listener.transcripts.get_nowait()
+        except queue.Empty:
+            return
+
+
+def _rms(data) -> float:
+    samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+    return float(np.sqrt(np.mean(samples * samples))) if samples.size else 0.0
+
+
+def _cpu_share(cpu: float, wall: float) -> str:
+    return f"{100 * cpu / wall:.1f}%" if wall else "n/a"
+
+
+def s2t_summary() -> str:
+    s = s2t_stats
+    avg = s["latency_total"] / s["utterances"] if s["utterances"] else None
+    fmt = lambda v: f"{v:.3f}s" if v is not None else "n/a"
+    rtf = f"{s['decode_s'] / s['audio_s']:.2f}" if s["audio_s"] else "n/a"
+    return (f"stt: {s['utterances']} utterances ({s['pretranscribed']} ready before asked for), "
+            f"{s['dropped_blocks']} dropped frames, decode RTF {rtf}, "
+            f"end-of-speech-to-text last {fmt(s['latency_last'])} avg {fmt(avg)}, "
+            f"CPU while waiting for speech {_cpu_share(s['idle_cpu'], s['idle_wall'])}")
+
+
+class _Listener:
+    """Recognizer thread: reads the audio ring and queues (text, latency) per utterance."""
+
+    def __init__(self):
+        self.transcripts = queue.Queue()
+        self.waiting = threading.Event()   # a caller is blocked in s2t(): show partial results
+        self.wake_word = None
+        self.pretranscribe = False         # keep transcribing while nobody is waiting
+        self._gate = None
+        self._end = threading.Event()      # finish the current utterance now (Ctrl+C)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stt", daemon=True)
+                self._thread.start()
+
+    def end_utterance(self):
+        self._end.set()
+
+    def _wanted(self) -> bool:
+        return self.pretranscribe or self.waiting.is_set()
+
+    def _run(self):
+        ring = _audio_ring()
+        while True:
+            if not self._wanted():
+                # nobody will ask for the next utterance: drop what the mic hears meanwhile
+                ring.clear()
+                self.waiting.wait(0.1)
+                continue
+            if self.wake_word and not self._wait_for_wake(ring) and not self._end.is_set():
+                continue
+            text, speech_end = self._utterance(ring, WAKE_LISTEN if self.wake_word else None)
+            ended = self._end.is_set()
+            self._end.clear()
+            if text:
+                # new input arrived: stop any reply still being spoken
+                cancel_speech()
+            if text or ended:
+                latency = _now() - speech_end if text and speech_end is not None else None
+                self.transcripts.put((text, latency))
+
+    def _decode(self, data):
+        """Feed one block to the full recognizer; return (final text or None, partial)."""
+        t0 = time.perf_counter()
+        try:
+            if constants.rec.AcceptWaveform(data.tobytes()):
+                return json.loads(constants.rec.Result())["text"], ""
+            return None, json.loads(constants.rec.PartialResult())["partial"]
+        finally:
+            s2t_stats["decode_s"] += time.perf_counter() - t0
+            s2t_stats["audio_s"] += data.size / constants.channels / constants.samplerate
+
+    def _wait_for_wake(self, ring) -> bool:
+        phrase = " ".join(self.wake_word.lower().split())
+        if self._gate is None or self._gate.phrase != phrase:
+            self._gate = WakeGate(phrase)
+        self._gate.reset()
+        started, cpu = time.monotonic(), time.thread_time()
+        try:
+            while not self._end.is_set() and self._wanted():
+                item = ring.read(timeout=0.1)
+                if item is None:
+                    continue
+                captured, data = item
+                if speaker.audible_at(captured) and _rms(data) < constants.barge_in_threshold:
+                    continue
+                if self._gate.feed(data):
+                    wake_stats["wakes"] += 1
+                    return True
+            # Ctrl+C (then _utterance() returns at once) or nobody is waiting any more
+            return False
+        finally:
+            wake_stats["idle_wall"] += time.monotonic() - started
+            wake_stats["idle_cpu"] += time.thread_time() - cpu
+
+    def _utterance(self, ring, give_up: float = None):
+        """Decode until one utterance ends; return (text, end-of-speech time).
+
+        give_up: return ("", None) after this many seconds without speech,
+        e.g. after a false wake, so the full recognizer does not stay on.
+        """
+        constants.rec.Reset()
+        block_secs = constants.blocksize / constants.samplerate
+        heard = False
+        silence = 0.0
+        speech_end = None
+        last_partial = ""
+        # CPU spent decoding before any speech arrives, to compare with wake-word mode
+        idle_since, idle_cpu = time.monotonic(), time.thread_time()
+        last_speech = None
+        while True:
+            if self._end.is_set():
+                return json.loads(constants.rec.FinalResult())["text"], speech_end or _now()
+            if not self._wanted():
+                return "", None
+            item = ring.read(timeout=0.1)
+            if item is None:
+                continue
+            captured, data = item
+            if last_speech is None:
+                last_speech = captured
+            # while a reply is playing only loud speech counts, and the echo is not decoded
+            echo = speaker.audible_at(captured)
+            speech = _rms(data) >= (constants.barge_in_threshold if echo else constants.energy_threshold)
+            if speech:
+                if echo:
+                    cancel_speech()     # barge-in
+                last_speech = captured
+                if idle_since is not None:
+                    s2t_stats["idle_wall"] += time.monotonic() - idle_since
+                    s2t_stats["idle_cpu"] += time.thread_time() - idle_cpu
+                    idle_since = None
+                heard, silence, speech_end = True, 0.0, None
+            elif heard:
+                if speech_end is None:
+                    speech_end = captured - block_secs
+                silence += block_secs
+
+            if give_up is not None and not heard and captured - last_speech > give_up:
+                if idle_since is not None:
+                    s2t_stats["idle_wall"] += time.monotonic() - idle_since
+                    s2t_stats["idle_cpu"] += time.thread_time() - idle_cpu
+                return "", None
+            text, partial = self._decode(data) if speech or not echo else (None, last_partial)
+            if text is not None:
+                if text:
+                    return text, speech_end if speech_end is not None else captured
+                heard, silence, speech_end, last_partial = False, 0.0, None, ""
+                continue
+
+            if partial != last_partial:
+                if self.waiting.is_set():
+                    print("\r" + partial, end="", flush=True)
+                last_partial = partial
+
+            if heard and silence >= constants.trailing_silence:
+                text = json.loads(constants.rec.FinalResult())["text"]
+                if text:
+                    return text, speech_end
+                heard, silence, speech_end, last_partial = False, 0.0, None, ""
+
+
+_listener = _Listener()
+
+
+def s2t(wake_word: str = None, pretranscribe: bool = False):
+    """Return the next utterance, waiting for one if none was transcribed yet.
+
+    wake_word: only utterances spoken after this phrase are transcribed.
+    pretranscribe: keep listening after this call returns, so an utterance
+    spoken during the turn is ready for the next call. Otherwise audio
+    captured between calls is discarded.
+    """
     # If recognizer wasn't created (e.g., model failed to load), fall back to typed input.
     if constants.rec is None:
         print("Speech recognizer unavailable — falling back to typed input.")
@@ -28,17 +479,95 @@ def s2t():
         except EOFError:
             return ""
 
-    with sd.RawInputStream(samplerate=constants.samplerate, blocksize=constants.blocksize, dtype='int16',
-                        channels=constants.channels, callback=callback):
-        print("Speak… Ctrl+C to stop.")
+    _listener.wake_word = wake_word
+    _listener.pretranscribe = pretranscribe
+    _listener.start()
+    _ensure_stream()
+    if not pretranscribe:
+        flush_audio()
+    try:
+        text, latency = _listener.transcripts.get_nowait()
+        s2t_stats["pretranscribed"] += 1
+    except queue.Empty:
+        print(f"Say \"{wake_word}\"… Ctrl+C to stop." if wake_word else "Speak… Ctrl+C to stop.")
+        _listener.waiting.set()
         try:
-            while True:
-                data = constants.q.get()
-                if constants.rec.AcceptWaveform(data):
-                    text = json.loads(constants.rec.Result())["text"]
-                    print(text)
-                    return text
+            text, latency = _listener.transcripts.get()
         except KeyboardInterrupt:
-            text = json.loads(constants.rec.FinalResult())["text"]
-            print(text)
-            return text
+            _listener.end_utterance()
+            text, latency = _listener.transcripts.get()
+        finally:
+            _listener.waiting.clear()
+    print("\r" + text)
+    if latency is not None:
+        s2t_stats["utterances"] += 1
+        s2t_stats["latency_last"] = latency
+        s2t_stats["latency_total"] += latency
+    return text
+
+
+''' Wake word '''
+# While waiting for the wake phrase, blocks below the energy threshold are
+# not decoded at all; louder audio (plus a short pre-roll) goes to a small
+# recognizer restricted to the wake phrase. Only after the phrase is heard
+# does the full recognizer run, on the audio that follows it (see
+# _Listener._wait_for_wake).
+WAKE_PREROLL = 3       # quiet blocks fed before a loud one so the phrase onset is not cut
+WAKE_LISTEN = 5.0      # seconds without speech after a wake before going back to the gate
+wake_stats = {"wakes": 0, "blocks": 0, "decoded": 0, "idle_wall": 0.0, "idle_cpu": 0.0}
+
+
+class WakeGate:
+    """Energy gate plus a grammar-restricted recognizer that spots one phrase."""
+
+    def __init__(self, phrase: str, model=None):
+        self.phrase = " ".join(phrase.lower().split())
+        # phrase words must be in the model's vocabulary; [unk] absorbs everything else
+        self.rec = constants.vosk.KaldiRecognizer(model or constants.model, constants.samplerate,
+                                                  json.dumps([self.phrase, "[unk]"]))
+        self.hangover = max(1, int(constants.trailing_silence * constants.samplerate / constants.blocksize))
+        self._preroll = []
+        self._active = 0
+
+    def reset(self):
+        self.rec.Reset()
+        self._preroll.clear()
+        self._active = 0
+
+    def _decode(self, data) -> str:
+        wake_stats["decoded"] += 1
+        if self.rec.AcceptWaveform(bytes(data)):
+            return json.loads(self.rec.Result())["text"]
+        return json.loads(self.rec.PartialResult())["partial"]
+
+    def feed(self, data) -> bool:
+        """Process one audio block; return True once the wake phrase has been heard."""
+        wake_stats["blocks"] += 1
+        if _rms(data) >= constants.energy_threshold:
+            blocks = self._preroll + [data] if not self._active else [data]
+            self._preroll = []
+            self._active = self.hangover
+        elif self._active:
+            blocks = [data]
+            self._active -= 1
+        else:
+            self._preroll = (self._preroll + [data])[-WAKE_PREROLL:]
+            return False
+        for block in blocks:
+            if self.phrase in self._decode(block):
+                self.reset()
+                return True
+        if not self._active:
+            # the sound burst ended without the phrase
+            heard = self.phrase in json.loads(self.rec.FinalResult())["text"]
+            self.reset()
+            return heard
+        return False
+
+
+def wake_summary() -> str:
+    s = wake_stats
+    decoded = f"{100 * s['decoded'] / s['blocks']:.0f}%" if s["blocks"] else "n/a"
+    return (f"wake: {s['wakes']} wakes, {decoded} of {s['blocks']} idle blocks decoded, "
+            f"CPU while waiting {_cpu_share(s['idle_cpu'], s['idle_wall'])} "
+            f"(compare stt's CPU while waiting for speech, which decodes every block)")